@@ -0,0 +1,202 @@
+#! python3
+"""
+Load benchmarks for the HTTP API. They serve the app with uvicorn in this
+process, point the CoinMarketCap client at the bundled fake CoinMarketCap API
+(src.fake_coin_api), seed a throwaway database with a watchlist and transaction
+history, then time bursts of concurrent requests to the read endpoints. Each
+burst reports its latencies, along with the credits it spent and how many
+quotes the quote cache served.
+
+Importing main connects to the configured database first, so run this where
+the app itself can run (such as the backend container), from the backend
+directory:
+
+    python -m benchmarks.bench_api --host mongodb://mongodb:27017
+"""
+
+# PSL Imports
+import argparse
+import asyncio
+import time
+
+# 3p Imports
+import aiohttp
+import uvicorn
+
+# Internal Imports
+from benchmarks.generators import generate_listing, generate_records, sizes
+from benchmarks.timing import measure_async, report, result
+import src.coin_api as coin_api
+import src.database as db
+import src.fake_coin_api as fake_coin_api
+
+
+ENDPOINTS = [
+    '/',
+    '/summary',
+    '/summary/Coin 1',
+    '/records/Coin 1?limit=100',
+    '/coins?q=Coin 1',
+]
+
+
+def __percentile(latencies, percent):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def __load(session, url, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def call():
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.get(url) as response:
+                await response.read()
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        'best': elapsed,
+        'mean': elapsed,
+        'rounds': 1,
+        'p50': __percentile(latencies, 50),
+        'p95': __percentile(latencies, 95),
+        'requests_per_second': requests / elapsed
+    }
+
+
+async def __seed(app, session, base_url, coins, records):
+    for document in (db.Coin, db.Watch, db.Transaction, db.Position,
+                     db.DailyRollup):
+        document.objects().delete()
+    coin_api.quote_cache.clear()
+    db.update_coin_list(generate_listing(coins))
+    app.coin_index.load(await db.get_coin_list())
+    names = [f'Coin {i}' for i in range(1, coins + 1)]
+    async with session.post(f'{base_url}/watch/batch',
+                            json={'names': names}) as response:
+        response.raise_for_status()
+    await db.create_transactions([
+        {
+            'market_id': r['market_id'],
+            'quantity': r['quantity'],
+            'quote': {'name': r['name'], 'price': r['price_in_usd']},
+            'type': r['type']
+        }
+        for r in generate_records(records, coins)
+    ])
+
+
+def __usage(fake):
+    stats = coin_api.quote_cache.stats()
+    return {
+        'credits': sum(fake.credits.values()),
+        'cache_hits': stats['hits'],
+        'cache_misses': stats['misses'] + stats['coalesced']
+    }
+
+
+def __spent(before, after):
+    spent = {k: after[k] - before[k] for k in before}
+    lookups = spent['cache_hits'] + spent['cache_misses']
+    spent['cache_hit_rate'] = spent['cache_hits'] / lookups if lookups else None
+    return spent
+
+
+async def __run(app, fake, records, requests, concurrency, rounds):
+    results = []
+    max_coins = fake.coins
+    fake_server, fake_url = await fake_coin_api.start(fake, port=8801)
+    config = uvicorn.Config(app.app, port=8802, log_level='warning')
+    server = uvicorn.Server(config)
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+        await coin_api.start_session(base_url=fake_url)
+        base_url = 'http://localhost:8802'
+        async with aiohttp.ClientSession() as session:
+            for coins in sizes(10, max_coins):
+                await __seed(app, session, base_url, coins, records)
+                params = {'coins': coins}
+                ids = [str(i) for i in range(1, coins + 1)]
+                results.append(result(
+                    'api', 'fetch_coin_quotes', params,
+                    await measure_async(
+                        lambda: coin_api.fetch_coin_quotes(ids), rounds
+                    )
+                ))
+                for endpoint in ENDPOINTS:
+                    params = {'coins': coins, 'records': records,
+                              'requests': requests}
+                    before = __usage(fake)
+                    timing = await __load(session, base_url + endpoint,
+                                          requests, concurrency)
+                    spent = __spent(before, __usage(fake))
+                    results.append(result('api', f'GET {endpoint}', params,
+                                          timing, **spent))
+    finally:
+        server.should_exit = True
+        await serving
+        await fake_server.cleanup()
+    return results
+
+
+def run(host, database='coinroll_benchmark', max_coins=1000, records=10000,
+        requests=500, concurrency=50, rounds=3, latency=0.0, error_rate=0.0):
+    """
+    This function runs the API benchmarks against a throwaway database, which
+    is dropped afterwards.
+
+    :param host: The MongoDB connection string.
+    :param database: The name of the throwaway database.
+    :param max_coins: The largest watchlist to time.
+    :param records: The number of transactions in the seeded history.
+    :param requests: The number of requests made to each endpoint.
+    :param concurrency: The number of requests in flight at once.
+    :param rounds: The number of timings taken of the client benchmarks.
+    :param latency: The seconds the fake CoinMarketCap API delays responses.
+    :param error_rate: The fraction of fake CoinMarketCap API requests that
+    fail.
+    :return: A list of benchmark results.
+    """
+    import main as app
+    fake = fake_coin_api.FakeCoinApi(
+        coins=max_coins, latency=latency, error_rate=error_rate
+    )
+    db.db.disconnect()
+    connection = db.db.connect(db=database, host=host, alias='default')
+    try:
+        db.ensure_indexes()
+        return asyncio.run(
+            __run(app, fake, records, requests, concurrency, rounds)
+        )
+    finally:
+        connection.drop_database(database)
+        db.db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='coinroll_benchmark')
+    parser.add_argument('--max-coins', type=int, default=1000)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    report(run(args.host, args.database, args.max_coins, args.records,
+               args.requests, args.concurrency, args.rounds, args.latency,
+               args.error_rate))
+
+
+if __name__ == '__main__':
+    main()
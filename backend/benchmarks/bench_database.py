@@ -0,0 +1,142 @@
+#! python3
+"""
+Benchmarks for the database layer. They seed a throwaway database with
+synthetic data, then time the bulk write paths (update_coin_list and
+update_watchlist) and the read paths (full and paginated transaction history).
+A load benchmark times a burst of concurrent history reads twice: once through
+the offloaded functions in src.database, and once calling the same queries
+directly on the event loop, the way they ran before being offloaded.
+
+Run from the backend directory against a local mongod, or against mongomock
+if it is installed:
+
+    python -m benchmarks.bench_database --host mongodb://localhost:27017
+    python -m benchmarks.bench_database --host mongomock://localhost
+"""
+
+# PSL Imports
+import argparse
+import asyncio
+
+# Internal Imports
+from benchmarks.generators import (
+    generate_listing, generate_quotes, generate_records, sizes
+)
+from benchmarks.timing import measure, measure_async, report, result
+import src.database as db
+
+
+def __seed_transactions(count, coins):
+    db.Transaction.objects().delete()
+    db.Transaction.objects.insert(
+        [db.Transaction(**r) for r in generate_records(count, coins)],
+        load_bulk=False
+    )
+
+
+def __seed_watchlist(coins):
+    db.Watch.objects().delete()
+    db.Watch.objects.insert([
+        db.Watch(market_id=q['id'], name=q['name'], price=0.0)
+        for q in generate_quotes(coins)
+    ], load_bulk=False)
+
+
+async def __blocking_read(_id):
+    return db.get_all_transactions_by_id.__wrapped__(_id)
+
+
+async def __burst(read, requests, coins):
+    await asyncio.gather(*(read(i % coins + 1) for i in range(requests)))
+
+
+def __run_writes(max_coins, rounds):
+    results = []
+    for coins in sizes(10, max_coins):
+        listing = generate_listing(coins)
+        db.Coin.objects().delete()
+        params = {'coins': coins}
+        inserted = measure(lambda: db.update_coin_list(listing), 1)
+        unchanged = measure(lambda: db.update_coin_list(listing), rounds)
+        results.append(result('database', 'update_coin_list (insert)',
+                              params, inserted))
+        results.append(result('database', 'update_coin_list (unchanged)',
+                              params, unchanged))
+        __seed_watchlist(coins)
+        quotes = [generate_quotes(coins, seed) for seed in range(rounds + 1)]
+        rotation = iter(quotes)
+        timing = measure(
+            lambda: asyncio.run(db.update_watchlist(next(rotation))), rounds
+        )
+        results.append(result('database', 'update_watchlist', params, timing))
+    return results
+
+
+def __run_reads(max_records, rounds, requests):
+    results = []
+    for count in sizes(1000, max_records):
+        __seed_transactions(count, 20)
+        params = {'records': count}
+        results.append(result('database', 'get_all_transactions', params,
+                              measure(lambda: asyncio.run(
+                                  db.get_all_transactions()), rounds)))
+        results.append(result('database', 'get_transactions_page', params,
+                              measure(lambda: asyncio.run(
+                                  db.get_transactions_page(limit=100)),
+                                  rounds)))
+        params = {'records': count, 'requests': requests}
+        blocking = asyncio.run(measure_async(
+            lambda: __burst(__blocking_read, requests, 20), rounds
+        ))
+        offloaded = asyncio.run(measure_async(
+            lambda: __burst(db.get_all_transactions_by_id, requests, 20),
+            rounds
+        ))
+        results.append(result('database', 'history burst (on loop)', params,
+                              blocking))
+        results.append(result('database', 'history burst (offloaded)',
+                              params, offloaded,
+                              speedup=blocking['best'] / offloaded['best']))
+    return results
+
+
+def run(host, database='coinroll_benchmark', max_records=100000,
+        max_coins=10000, rounds=3, requests=200):
+    """
+    This function runs the database benchmarks against a throwaway database,
+    which is dropped afterwards.
+
+    :param host: The MongoDB connection string.
+    :param database: The name of the throwaway database.
+    :param max_records: The largest transaction history to time.
+    :param max_coins: The largest number of coins to time.
+    :param rounds: The number of timings taken of each benchmark.
+    :param requests: The number of concurrent reads in the load benchmark.
+    :return: A list of benchmark results.
+    """
+    connection = db.db.connect(db=database, host=host, alias='default')
+    try:
+        db.ensure_indexes()
+        results = __run_writes(max_coins, rounds)
+        results.extend(__run_reads(max_records, rounds, requests))
+    finally:
+        connection.drop_database(database)
+        db.db.disconnect()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='coinroll_benchmark')
+    parser.add_argument('--max-records', type=int, default=100000)
+    parser.add_argument('--max-coins', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+    report(run(args.host, args.database, args.max_records, args.max_coins,
+               args.rounds, args.requests))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#! python3
+"""
+Benchmarks for the portfolio module. They time get_summary, get_coin_summary
+and has_sufficient_coins over synthetic histories of growing size; with the
+lot-based FIFO engine and single-pass partition, the time per record should
+stay flat as the history grows. When NumPy is installed, get_summary and the
+replay used to rebuild positions are also timed with the portfolio_vectorized
+engine, which the portfolio_engine setting selects, so the two can be compared.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_portfolio --max-records 10000000
+"""
+
+# PSL Imports
+from importlib.util import find_spec
+import argparse
+
+# Internal Imports
+from benchmarks.generators import generate_quotes, generate_records, sizes
+from benchmarks.timing import measure, report, result
+import src.portfolio as portfolio
+import src.portfolio_vectorized as portfolio_vectorized
+
+
+ENGINES = {'': portfolio}
+if find_spec('numpy'):
+    ENGINES['vectorized.'] = portfolio_vectorized
+
+
+def run(max_records=100000, coins=(10, 1000), rounds=3):
+    """
+    This function runs the portfolio benchmarks.
+
+    :param max_records: The largest history to time, a power of ten.
+    :param coins: The numbers of distinct cryptocurrencies to time.
+    :param rounds: The number of timings taken of each benchmark.
+    :return: A list of benchmark results.
+    """
+    results = []
+    for count in sizes(1000, max_records):
+        for coin_count in coins:
+            records = generate_records(count, coin_count)
+            quotes = generate_quotes(coin_count)
+            params = {'records': count, 'coins': coin_count}
+            for prefix, engine in ENGINES.items():
+                for name, args in (('get_summary', (records, quotes)),
+                                   ('replay', (records,))):
+                    function = getattr(engine, name)
+                    timing = measure(lambda: function(*args), rounds)
+                    results.append(result(
+                        'portfolio', prefix + name, params, timing,
+                        per_record=timing['best'] / count
+                    ))
+        records = generate_records(count, 1)
+        quote = generate_quotes(1)[0]
+        params = {'records': count, 'coins': 1}
+        results.append(result('portfolio', 'get_coin_summary', params, measure(
+            lambda: portfolio.get_coin_summary(records, quote), rounds
+        )))
+        results.append(result('portfolio', 'has_sufficient_coins', params,
+                              measure(lambda: portfolio.has_sufficient_coins(
+                                  records, 1), rounds)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--max-records', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    report(run(args.max_records, rounds=args.rounds))
+
+
+if __name__ == '__main__':
+    main()
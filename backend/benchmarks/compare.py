@@ -0,0 +1,77 @@
+#! python3
+"""
+Compares two benchmark results files written by benchmarks.run, printing the
+change in the best time of every benchmark they share. Exits with an error if
+any benchmark got slower by more than the threshold.
+
+Run from the backend directory:
+
+    python -m benchmarks.compare benchmarks/results/abc1234.json \
+        benchmarks/results/def5678.json --threshold 0.1
+"""
+
+# PSL Imports
+import argparse
+import json
+import sys
+
+
+def __key(r):
+    params = tuple(sorted(r['params'].items()))
+    return r['suite'], r['name'], params
+
+
+def compare(baseline, candidate, threshold=0.1):
+    """
+    This function compares the results of two benchmark runs.
+
+    :param baseline: The results file contents of the earlier run.
+    :param candidate: The results file contents of the later run.
+    :param threshold: The fractional slowdown counted as a regression.
+    :return: A list of the benchmarks both runs share, each with its best time
+    in both runs, the fractional change and whether it regressed.
+    """
+    before = {__key(r): r for r in baseline['results']}
+    changes = []
+    for r in candidate['results']:
+        key = __key(r)
+        if key not in before:
+            continue
+        old, new = before[key]['best'], r['best']
+        change = (new - old) / old if old else 0.0
+        changes.append({
+            'suite': r['suite'],
+            'name': r['name'],
+            'params': r['params'],
+            'before': old,
+            'after': new,
+            'change': change,
+            'regressed': change > threshold
+        })
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    changes = compare(baseline, candidate, args.threshold)
+    for c in changes:
+        params = ' '.join(f'{k}={v}' for k, v in c['params'].items())
+        flag = '  REGRESSION' if c['regressed'] else ''
+        print(f'{c["suite"]:>9} {c["name"]:<32} {params:<32} '
+              f'{c["before"]:.4f}s -> {c["after"]:.4f}s '
+              f'({c["change"]:+.1%}){flag}')
+    if any(c['regressed'] for c in changes):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
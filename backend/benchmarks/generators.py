@@ -0,0 +1,94 @@
+#! python3
+"""
+Synthetic data generators shared by the benchmark suites. Every generator is
+seeded, so the same arguments always produce the same data.
+"""
+
+# PSL Imports
+from datetime import datetime, timedelta
+from random import Random
+
+
+def generate_records(count, coins, seed=0):
+    """
+    This function generates a valid, time-ordered transaction history in which
+    no sell exceeds the coins held at the time.
+
+    :param count: The number of transaction records to generate.
+    :param coins: The number of distinct cryptocurrencies traded.
+    :param seed: The seed for the random number generator.
+    :return: A list of transaction records.
+    """
+    rng = Random(seed)
+    held = [0] * (coins + 1)
+    start = datetime(2021, 1, 1)
+    records = []
+    for i in range(count):
+        _id = rng.randint(1, coins)
+        quantity = rng.randint(1, 100)
+        selling = held[_id] >= quantity and rng.random() < 0.4
+        held[_id] += -quantity if selling else quantity
+        records.append({
+            'market_id': _id,
+            'name': f'Coin {_id}',
+            'type': 'sell' if selling else 'purchase',
+            'transaction_time': start + timedelta(seconds=i),
+            'price_in_usd': rng.uniform(0.01, 50000),
+            'quantity': quantity
+        })
+    return records
+
+
+def generate_listing(coins):
+    """
+    This function generates a CoinMarketCap map listing.
+
+    :param coins: The number of cryptocurrencies in the listing.
+    :return: A list of cryptocurrencies, as returned by get_coin_listing.
+    """
+    return [{'id': i, 'name': f'Coin {i}', 'symbol': f'C{i}'}
+            for i in range(1, coins + 1)]
+
+
+def generate_quotes(coins, seed=0):
+    """
+    This function generates a quote for each generated cryptocurrency.
+
+    :param coins: The number of distinct cryptocurrencies.
+    :param seed: The seed for the random number generator.
+    :return: A list of quotes, as returned by get_coin_quotes.
+    """
+    rng = Random(seed)
+    quotes = []
+    for i in range(1, coins + 1):
+        price = rng.uniform(0.01, 50000)
+        quotes.append({
+            'id': i,
+            'name': f'Coin {i}',
+            'supply': 1000000,
+            'cap': int(price * 1000000),
+            'price': price,
+            'volume': rng.randint(1000, 10 ** 9),
+            'percent_changes': {
+                'hour': rng.uniform(-2, 2),
+                'day': rng.uniform(-5, 5),
+                'week': rng.uniform(-20, 20)
+            }
+        })
+    return quotes
+
+
+def sizes(smallest, largest):
+    """
+    This function lists the powers of ten from one size to another.
+
+    :param smallest: The smallest size.
+    :param largest: The largest size.
+    :return: A list of sizes.
+    """
+    found = []
+    size = smallest
+    while size <= largest:
+        found.append(size)
+        size *= 10
+    return found
@@ -0,0 +1,83 @@
+#! python3
+"""
+Runs the benchmark suites and writes their results to a JSON file named for
+the current commit, so runs on different commits can be compared with
+benchmarks.compare. The database and API suites need a MongoDB server; pass
+--host mongomock://localhost to run the database suite on mongomock instead.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --suites portfolio database
+"""
+
+# PSL Imports
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import platform
+import subprocess
+
+# Internal Imports
+from benchmarks.timing import report
+
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+SUITES = ['portfolio', 'database', 'api']
+
+
+def __git(*args):
+    try:
+        return subprocess.run(
+            ['git', *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def __run_suite(suite, args):
+    if suite == 'portfolio':
+        from benchmarks import bench_portfolio
+        return bench_portfolio.run(args.max_records, rounds=args.rounds)
+    if suite == 'database':
+        from benchmarks import bench_database
+        return bench_database.run(args.host, args.database, args.max_records,
+                                  args.max_coins, args.rounds)
+    from benchmarks import bench_api
+    return bench_api.run(args.host, args.database, min(args.max_coins, 1000),
+                         rounds=args.rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--suites', nargs='+', choices=SUITES,
+                        default=['portfolio'])
+    parser.add_argument('--host', default='mongodb://localhost:27017')
+    parser.add_argument('--database', default='coinroll_benchmark')
+    parser.add_argument('--max-records', type=int, default=100000)
+    parser.add_argument('--max-coins', type=int, default=10000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--output', type=Path)
+    args = parser.parse_args()
+
+    results = []
+    for suite in args.suites:
+        results.extend(__run_suite(suite, args))
+    report(results)
+    commit = __git('rev-parse', '--short', 'HEAD')
+    dirty = bool(__git('status', '--porcelain', '--untracked-files=no'))
+    output = args.output or RESULTS_DIR / f'{commit or "unknown"}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        'commit': commit,
+        'dirty': dirty,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'results': results
+    }, indent=2))
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#! python3
+"""
+Timing helpers shared by the benchmark suites.
+"""
+
+# PSL Imports
+import time
+
+
+def measure(function, rounds=3):
+    """
+    This function times a function over several rounds.
+
+    :param function: The function to time, called without arguments.
+    :param rounds: The number of times to call it.
+    :return: The best and mean times in seconds, and the number of rounds.
+    """
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return {'best': min(times), 'mean': sum(times) / rounds, 'rounds': rounds}
+
+
+async def measure_async(function, rounds=3):
+    """
+    This function times a coroutine function over several rounds.
+
+    :param function: The coroutine function to time, called without arguments.
+    :param rounds: The number of times to await it.
+    :return: The best and mean times in seconds, and the number of rounds.
+    """
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await function()
+        times.append(time.perf_counter() - started)
+    return {'best': min(times), 'mean': sum(times) / rounds, 'rounds': rounds}
+
+
+def result(suite, name, params, timing, **extra):
+    """
+    This function formats one benchmark result for the results file.
+
+    :param suite: The name of the benchmark suite.
+    :param name: The name of the benchmark.
+    :param params: The parameters the benchmark ran with.
+    :param timing: The timing, as returned by measure or measure_async.
+    :return: The benchmark result.
+    """
+    return {'suite': suite, 'name': name, 'params': params, **timing, **extra}
+
+
+def report(results):
+    """
+    This function prints benchmark results as a table.
+
+    :param results: A list of benchmark results.
+    :return: None
+    """
+    for r in results:
+        params = ' '.join(f'{k}={v}' for k, v in r['params'].items())
+        print(f'{r["suite"]:>9} {r["name"]:<32} {params:<32} '
+              f'best {r["best"]:.4f}s  mean {r["mean"]:.4f}s')
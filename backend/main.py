@@ -1,19 +1,33 @@
 #! python3
 
 # PSL Imports
-from typing import Optional
+from datetime import date, datetime, timedelta
+from typing import List, Literal, Optional
 import asyncio
+import csv
+import io
+import json
+import sys
+import time
 
 # 3p Imports
 from celery import Celery
-from fastapi import FastAPI
-from pydantic import BaseModel
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, conint
 import uvicorn
 
 # Internal Imports
+from src.broadcast import Broadcaster, diff_watches
+from src.coin_index import CoinIndex
 import src.coin_api as coin_api
 import src.database as db
+import src.metrics as metrics
 import src.portfolio as portfolio
+import src.pricing as pricing
+import src.scheduler as scheduler
+import src.settings as settings
 
 
 def initialize_db(query_api=False):
@@ -27,7 +41,12 @@ def initialize_db(query_api=False):
     """
     db.connect_to_db()
     if query_api:
-        db.update_coin_list(coin_api.get_coin_listing())
+        listing = asyncio.run(coin_api.get_coin_listing())
+        db.update_coin_list(listing)
+        coin_index.load(
+            {'market_id': c['id'], 'name': c['name'], 'symbol': c['symbol']}
+            for c in listing
+        )
 
 
 def make_celery():
@@ -44,11 +63,85 @@ def make_celery():
     return celery
 
 
+RECORD_FIELDS = [
+    'market_id', 'name', 'type', 'transaction_time', 'price_in_usd', 'quantity'
+]
+
 app = FastAPI()
+app.add_middleware(metrics.TimingMiddleware)
+coin_index = CoinIndex()
+broadcaster = Broadcaster()
+__publisher = {'task': None}
+coin_api.credit_listeners.append(db.record_credits)
 initialize_db()
 celery_app = make_celery()
 
 
+__worker = {'loop': None, 'task_starts': {}}
+
+
+def get_worker_loop():
+    """
+    This function returns the event loop this Celery worker process runs its
+    tasks on, creating it and opening its CoinMarketCap API session the first
+    time it is needed.
+
+    :return: The worker process's event loop.
+    """
+    if __worker['loop'] is None:
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(coin_api.start_session())
+        __worker['loop'] = loop
+    return __worker['loop']
+
+
+@worker_process_shutdown.connect
+def close_worker_loop(**_):
+    """
+    This function closes the worker process's CoinMarketCap API session and
+    event loop when the process shuts down.
+
+    :return: None
+    """
+    loop = __worker['loop']
+    if loop is not None:
+        loop.run_until_complete(coin_api.close_session())
+        loop.close()
+        __worker['loop'] = None
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **_):
+    """
+    This function notes when a Celery task starts running.
+
+    :param task_id: The ID of the task run.
+    :return: None
+    """
+    __worker['task_starts'][task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **_):
+    """
+    This function records how long a Celery task took once it has finished, so
+    that the API process can report it on the metrics endpoint.
+
+    :param task_id: The ID of the task run.
+    :param task: The task that ran.
+    :param state: The state the task finished in.
+    :return: None
+    """
+    started = __worker['task_starts'].pop(task_id, None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    try:
+        db.record_task_run(task.name, seconds, failed=state == 'FAILURE')
+    except Exception as e:
+        print(f'Could not record the duration of {task.name}: {e!r}')
+
+
 @celery_app.task
 def update_watchlist_prices():
     """
@@ -57,11 +150,127 @@ def update_watchlist_prices():
 
     :return: None
     """
-    watchlist = asyncio.run(get_watchlist())
-    ids = list(set(str(coin['market_id']) for coin in watchlist))
-    quotes = asyncio.run(coin_api.get_coin_quotes(ids))
-    asyncio.run(db.update_watchlist(quotes))
-    print('Watchlist updated with current crypto prices.')
+    result = get_worker_loop().run_until_complete(pricing.refresh_watchlist())
+    plan = result['plan']
+    if not plan['ids']:
+        print('Watchlist refresh skipped: nothing is due '
+              f'(refreshing every {plan["interval"]:.0f}s).')
+        return
+    for failure in result['failures']:
+        print(f'Could not refresh {failure["ids"]}: {failure["error"]}')
+    print('Watchlist updated with current crypto prices: '
+          f'{result["written"]} written, {result["unchanged"]} unchanged '
+          f'in {result["seconds"]:.3f}s, using {plan["credits"]} credits '
+          f'(refreshing every {plan["interval"]:.0f}s).')
+
+
+async def find_coin(name):
+    """
+    This function finds a cryptocurrency by its name, ticker symbol or market
+    ID, using the in-memory coin index and only falling back to the database for
+    coins the index doesn't know about.
+
+    :param name: The name, ticker symbol or market ID of the cryptocurrency.
+    :return: The jsonified Coin.
+    """
+    return coin_index.resolve(name) or await db.get_coin_from_db(name)
+
+
+@app.on_event('startup')
+async def load_coin_index():
+    """
+    This function loads the list of available cryptocurrencies into the
+    in-memory coin index when the server starts.
+
+    :return: None
+    """
+    coin_index.load(await db.get_coin_list())
+
+
+@app.on_event('startup')
+async def start_api_client():
+    """
+    This function opens the shared CoinMarketCap API session when the server
+    starts.
+
+    :return: None
+    """
+    await coin_api.start_session()
+
+
+async def publish_updates():
+    """
+    This function watches for the Watches the watchlist refresh updates, and
+    publishes the fields that changed, along with the recomputed portfolio
+    summary for each changed cryptocurrency the user holds, to every client
+    of the update stream. The work is done once per refresh, however many
+    clients are listening, and skipped while no clients are.
+
+    :return: None
+    """
+    snapshot = {}
+    since = None
+    while True:
+        await asyncio.sleep(settings.get('stream_poll_interval'))
+        if not len(broadcaster):
+            continue
+        try:
+            watches = await db.get_watch_updates(since)
+            if not watches:
+                continue
+            since = max(w['last_updated'] for w in watches)
+            changes = diff_watches(snapshot, watches)
+            if not changes:
+                continue
+            ids = [change['market_id'] for change in changes]
+            positions = await db.get_positions(ids)
+            priced = {
+                _id: p for _id, p in positions.items()
+                if p['usd_invested'] and snapshot[_id].get('price') is not None
+            }
+            broadcaster.publish({
+                'watchlist': changes,
+                'portfolio': {
+                    _id: portfolio.summarize_position(p, snapshot[_id])
+                    for _id, p in priced.items()
+                }
+            })
+        except Exception as e:
+            print(f'Could not publish watchlist updates: {e!r}')
+
+
+@app.on_event('startup')
+async def start_publishing_updates():
+    """
+    This function starts publishing watchlist updates when the server starts.
+
+    :return: None
+    """
+    __publisher['task'] = asyncio.create_task(publish_updates())
+
+
+@app.on_event('shutdown')
+async def stop_publishing_updates():
+    """
+    This function stops publishing watchlist updates when the server shuts
+    down.
+
+    :return: None
+    """
+    task = __publisher['task']
+    if task:
+        task.cancel()
+
+
+@app.on_event('shutdown')
+async def stop_api_client():
+    """
+    This function closes the shared CoinMarketCap API session when the server
+    shuts down.
+
+    :return: None
+    """
+    await coin_api.close_session()
 
 
 class Transaction(BaseModel):
@@ -70,10 +279,25 @@ class Transaction(BaseModel):
     the user's personal stores.
 
     :param name: The name of the cryptocurrency.
-    :param quantity: The quantity of cryptocurrency involved in the transaction.
+    :param quantity: The quantity of cryptocurrency involved in the transaction,
+    which must be positive.
     """
     name: str
-    quantity: int
+    quantity: conint(gt=0)
+
+
+class Trade(BaseModel):
+    """
+    Trade represents one purchase or sale in a batch of trades.
+
+    :param name: The name of the cryptocurrency.
+    :param quantity: The quantity of cryptocurrency involved in the trade, which
+    must be positive.
+    :param type: The type of trade - a purchase or a sell.
+    """
+    name: str
+    quantity: conint(gt=0)
+    type: Literal['purchase', 'sell']
 
 
 class Watch(BaseModel):
@@ -90,6 +314,16 @@ class Watch(BaseModel):
     name: str
 
 
+class WatchBatch(BaseModel):
+    """
+    WatchBatch encapsulates the names of several cryptocurrencies to be added to
+    the user's watchlist at once.
+
+    :param names: The common names for the coins.
+    """
+    names: List[str]
+
+
 @app.get('/')
 async def get_watchlist():
     """
@@ -107,20 +341,65 @@ async def watch_coin(watch: Watch):
 
     :param watch: The Watch object representing the desired cryptocurrency.
     :return: Either a status message from the database, or a message stating the
-    coin is already on the watchlist.
+    coin is already on the watchlist or that its price is unavailable.
     """
-    coin = await db.get_coin_from_db(watch.name)
+    coin = await find_coin(watch.name)
     _id = coin.get('market_id')
     coin_in_watchlist = await db.get_coin_from_watchlist(_id)
     if not coin_in_watchlist:
-        raw_metadata = await coin_api.get_coin_metadata([str(_id)])
+        raw_metadata, raw_quote = await asyncio.gather(
+            coin_api.get_coin_metadata([str(_id)]),
+            coin_api.get_coin_quotes([str(_id)])
+        )
+        if not raw_metadata or not raw_quote:
+            return {'Msg': 'Prices are unavailable right now.'}
         metadata = raw_metadata[0]
-        raw_quote = await coin_api.get_coin_quotes([str(_id)])
         quote = raw_quote[0]
-        return await db.add_watched_coin(_id, metadata, quote)
+        saved = await db.add_watched_coin(_id, metadata, quote)
+        if saved is not None:
+            return saved
     return {'Msg': 'That coin is already being watched.'}
 
 
+@app.post('/watch/batch')
+async def watch_coins(batch: WatchBatch):
+    """
+    This function allows the user to add several cryptocurrencies to their
+    watchlist at once, fetching the metadata and prices for all of them together.
+
+    :param batch: The WatchBatch object listing the desired cryptocurrencies.
+    :return: The cryptocurrencies that were added, those that were already being
+    watched, those whose metadata or prices are unavailable right now, and any
+    names that couldn't be found.
+    """
+    coins = {name: coin_index.resolve(name) for name in batch.names}
+    unknown = [name for name, coin in coins.items() if not coin]
+    if unknown:
+        found = {c['name'].lower(): c for c in await db.get_coins_from_db(unknown)}
+        coins.update((name, found.get(name.lower())) for name in unknown)
+    ids = {coin['market_id']: name for name, coin in coins.items() if coin}
+    watched = await db.get_watched_ids(ids)
+    new_ids = [_id for _id in ids if _id not in watched]
+    quotes = {}
+    added = {'added': [], 'already_watched': []}
+    if new_ids:
+        requested = [str(_id) for _id in new_ids]
+        raw_metadata, raw_quotes = await asyncio.gather(
+            coin_api.get_coin_metadata(requested),
+            coin_api.get_coin_quotes(requested)
+        )
+        metadata = {m['id']: m for m in raw_metadata}
+        quotes = {q['id']: q for q in raw_quotes if q['id'] in metadata}
+        added = await db.add_watched_coins(metadata, quotes)
+    already_watched = [*watched, *added['already_watched']]
+    return {
+        'added': [ids[_id] for _id in added['added']],
+        'already_watched': [ids[_id] for _id in already_watched],
+        'unavailable': [ids[_id] for _id in new_ids if _id not in quotes],
+        'not_found': [name for name, coin in coins.items() if not coin]
+    }
+
+
 @app.delete('/watch')
 async def unwatch_coin(watch: Watch):
     """
@@ -131,7 +410,7 @@ async def unwatch_coin(watch: Watch):
     :return: The status message from the database.
     """
     if not watch.market_id:
-        coin = await db.get_coin_from_db(watch.name)
+        coin = await find_coin(watch.name)
         watch.market_id = coin.get('market_id')
     return await db.remove_watched_coin(watch.market_id)
 
@@ -142,11 +421,14 @@ async def buy_coin(buy: Transaction):
     This function allows the user to "purchase" a cryptocurrency.
 
     :param buy: The Transaction object representing the desired purchase order.
-    :return: The status message from the database.
+    :return: Either the status message from the database, or a message stating
+    that no price is available for the cryptocurrency.
     """
-    coin = await db.get_coin_from_db(buy.name)
+    coin = await find_coin(buy.name)
     _id = coin.get('market_id')
-    raw_quote = await coin_api.get_coin_quotes([str(_id)])
+    raw_quote = await pricing.get_quotes([str(_id)])
+    if not raw_quote:
+        return {'Msg': 'Prices are unavailable right now.'}
     quote = raw_quote[0]
     return await db.create_transaction(_id, buy.quantity, quote, 'purchase')
 
@@ -158,58 +440,172 @@ async def sell_coin(sell: Transaction):
 
     :param sell: The Transaction object representing the desired sell order.
     :return: Either the status message from the database, or a message stating
-    the user has insufficient coins.
+    the user has insufficient coins or that no price is available for the
+    cryptocurrency.
     """
-    coin = await db.get_coin_from_db(sell.name)
+    coin = await find_coin(sell.name)
     _id = coin.get('market_id')
-    records = await db.get_all_transactions_by_id(_id)
-    if portfolio.has_sufficient_coins(records, sell.quantity):
-        raw_quote = await coin_api.get_coin_quotes([str(_id)])
+    position = await db.get_position(_id)
+    if position['current_coins'] >= sell.quantity:
+        raw_quote = await pricing.get_quotes([str(_id)])
+        if not raw_quote:
+            return {'Msg': 'Prices are unavailable right now.'}
         quote = raw_quote[0]
         qty = sell.quantity
-        return await db.create_transaction(_id, qty, quote, 'sell')
+        saved = await db.create_transaction(_id, qty, quote, 'sell')
+        if saved is not None:
+            return saved
     return {'Msg': 'Insufficient coins.'}
 
 
-@app.get('/records')
-async def get_all_records():
+@app.post('/trades')
+async def make_trades(trades: List[Trade]):
+    """
+    This function allows the user to "purchase" and "sell" several
+    cryptocurrencies at once. Every sell is checked against the user's holdings
+    after the trades before it, and nothing is recorded unless all of them can
+    be made.
+
+    :param trades: The Trade objects representing the desired orders, in the
+    order they should be made.
+    :return: Either the Transactions that were recorded, or a message stating
+    which trade the user has insufficient coins for or that prices are
+    unavailable.
     """
-    This function retrieves all transaction records from the database.
+    names = list(dict.fromkeys(trade.name for trade in trades))
+    coins = await asyncio.gather(*(find_coin(name) for name in names))
+    ids = {name: coin.get('market_id') for name, coin in zip(names, coins)}
+    positions = await db.get_positions(set(ids.values()))
+    holdings = {_id: p['current_coins'] for _id, p in positions.items()}
+    for i, trade in enumerate(trades):
+        _id = ids[trade.name]
+        if trade.type == 'sell' and holdings[_id] < trade.quantity:
+            return {'Msg': 'Insufficient coins.', 'trade': i}
+        change = trade.quantity if trade.type == 'purchase' else -trade.quantity
+        holdings[_id] += change
+    quotes = await pricing.get_quotes(set(ids.values()))
+    quotes = {q['id']: q for q in quotes}
+    if any(_id not in quotes for _id in ids.values()):
+        return {'Msg': 'Prices are unavailable right now.'}
+    try:
+        return await db.create_transactions([
+            {
+                'market_id': ids[trade.name],
+                'quantity': trade.quantity,
+                'quote': quotes[ids[trade.name]],
+                'type': trade.type
+            }
+            for trade in trades
+        ])
+    except db.InsufficientCoinsError as e:
+        return {'Msg': 'Insufficient coins.', 'trade': e.trade}
+
+
+async def __records_response(_id, limit, cursor, output):
+    if output == 'ndjson':
+        lines = (json.dumps(r, default=str) + '\n'
+                 for r in db.iter_transactions(_id))
+        return StreamingResponse(lines, media_type='application/x-ndjson')
+    if output == 'csv':
+        return StreamingResponse(
+            __csv_lines(db.iter_transactions(_id)),
+            media_type='text/csv'
+        )
+    if limit:
+        try:
+            return await db.get_transactions_page(_id, cursor, limit)
+        except db.InvalidCursorError:
+            raise HTTPException(400, 'Invalid cursor')
+    if _id is None:
+        return await db.get_all_transactions()
+    return await db.get_all_transactions_by_id(_id)
+
 
-    :return: The user's complete transaction history.
+def __csv_lines(records):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=RECORD_FIELDS,
+                            extrasaction='ignore')
+    writer.writeheader()
+    for record in records:
+        writer.writerow(record)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+@app.get('/records')
+async def get_all_records(
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    output: Optional[Literal['ndjson', 'csv']] = Query(None, alias='format')
+):
+    """
+    This function retrieves all transaction records from the database. The
+    records can be returned all at once, one page at a time, or streamed as
+    NDJSON or CSV.
+
+    :param limit: The optional number of records per page.
+    :param cursor: The cursor returned with the previous page.
+    :param output: The optional streaming format - ndjson or csv.
+    :return: The user's complete transaction history, or one page of it along
+    with the cursor for the next page.
     """
-    return await db.get_all_transactions()
+    return await __records_response(None, limit, cursor, output)
 
 
 @app.get('/records/{coin_name}')
-async def get_coin_records(coin_name: str):
+async def get_coin_records(
+    coin_name: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    output: Optional[Literal['ndjson', 'csv']] = Query(None, alias='format')
+):
     """
     This function retrieves all transaction records for a specific
-    cryptocurrency from the database.
+    cryptocurrency from the database. The records can be returned all at once,
+    one page at a time, or streamed as NDJSON or CSV.
 
     :param coin_name: The name of the cryptocurrency for which the user is
     requesting records.
+    :param limit: The optional number of records per page.
+    :param cursor: The cursor returned with the previous page.
+    :param output: The optional streaming format - ndjson or csv.
     :return: The user's complete transaction history for the stated 
-    cryptocurrency.
+    cryptocurrency, or one page of it along with the cursor for the next page.
     """
-    coin = await db.get_coin_from_db(coin_name)
+    coin = await find_coin(coin_name)
     _id = coin.get('market_id')
-    return await db.get_all_transactions_by_id(_id)
+    await db.mark_viewed(_id)
+    return await __records_response(_id, limit, cursor, output)
 
 
 @app.get('/summary')
-async def get_portfolio_summary():
+async def get_portfolio_summary(
+    start: Optional[date] = Query(None, alias='from'),
+    end: Optional[date] = Query(None, alias='to')
+):
     """
     This function retrieves a complete summary of the user's portfolio,
     including a per-cryptocurrency summary for each cryptocurrency the user has
-    "purchased."
+    "purchased." Cryptocurrencies whose prices couldn't be retrieved are left
+    out of the summary and its totals, and their market IDs are listed under
+    unpriced. If a range of days is given, the summary instead covers only the
+    trading done in that range.
 
+    :param start: The optional first day of the range.
+    :param end: The optional last day of the range.
     :return: The user's cryptocurrency investment portfolio.
     """
-    records = await db.get_all_transactions()
-    ids = list(set(str(record['market_id']) for record in records))
-    quotes = await coin_api.get_coin_quotes(ids)
-    return portfolio.get_summary(records, quotes)
+    if start or end:
+        rollups = await db.get_rollups(start or date.min, end or date.max)
+        return portfolio.summarize_rollups(rollups)
+    positions = await db.get_all_positions()
+    ids = [str(_id) for _id in positions]
+    quotes = await pricing.get_quotes(ids)
+    summary = portfolio.summarize_positions(positions, quotes)
+    summary['unpriced'] = portfolio.get_unpriced_ids(positions, quotes)
+    return summary
 
 
 @app.get('/summary/{coin_name}')
@@ -223,13 +619,155 @@ async def get_coin_summary(coin_name: str):
     :return: The user's cryptocurrency investment portfolio for the requested
     cryptocurrency.
     """
-    coin = await db.get_coin_from_db(coin_name)
+    coin = await find_coin(coin_name)
     _id = coin.get('market_id')
-    records = await db.get_all_transactions_by_id(_id)
-    raw_quote = await coin_api.get_coin_quotes([str(_id)])
+    await db.mark_viewed(_id)
+    position = await db.get_position(_id)
+    raw_quote = await pricing.get_quotes([str(_id)])
+    if not raw_quote:
+        return {'Msg': 'Prices are unavailable right now.'}
     quote = raw_quote[0]
-    return portfolio.get_coin_summary(records, quote)
+    return portfolio.summarize_position(position, quote)
 
 
+@app.get('/history/{coin_name}')
+async def get_price_history(
+    coin_name: str,
+    resolution: Literal['raw', '1m', '1h', '1d'] = 'raw',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+):
+    """
+    This function retrieves the prices recorded for a watched cryptocurrency by
+    the watchlist refresh.
+
+    :param coin_name: The name of the cryptocurrency.
+    :param resolution: raw for every recorded price, or 1m, 1h or 1d for the
+    open, high, low, close and average price over each period.
+    :param start: The optional start of the period of time (UTC), defaulting to
+    a day before the end.
+    :param end: The optional end of the period of time (UTC), defaulting to now.
+    :return: The recorded prices, oldest first.
+    """
+    coin = await find_coin(coin_name)
+    _id = coin.get('market_id')
+    await db.mark_viewed(_id)
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=1)
+    return await db.get_price_history(_id, resolution, start, end)
+
+
+@app.get('/stream')
+async def stream_updates(request: Request):
+    """
+    This function streams watchlist and portfolio updates to the client as
+    server-sent events, as soon as the watchlist refresh stores new prices.
+
+    :param request: The client's request.
+    :return: A stream of events, each holding the changed Watch fields and the
+    recomputed summaries for the changed cryptocurrencies the user holds.
+    """
+    queue = broadcaster.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'data: {json.dumps(message, default=str)}\n\n'
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type='text/event-stream')
+
+
+@app.get('/coins')
+async def search_coins(q: str, limit: int = Query(10, ge=1, le=100)):
+    """
+    This function searches the available cryptocurrencies by the start of their
+    name or ticker symbol, falling back to similarly spelled names when nothing
+    starts with the query.
+
+    :param q: The start of the name or ticker symbol to search for.
+    :param limit: The maximum number of cryptocurrencies to return.
+    :return: A list of matching cryptocurrencies, best matches first.
+    """
+    return coin_index.search(q, limit)
+
+
+@app.get('/budget')
+async def get_credit_budget():
+    """
+    This function reports how many CoinMarketCap API credits have been spent and
+    how many the watchlist refresh has left, along with how often the refresh
+    can currently run.
+
+    :return: The credit budget for today and this month, the size of the
+    watchlist, and the current refresh interval in seconds.
+    """
+    now = datetime.utcnow()
+    watches, usage = await asyncio.gather(
+        db.get_refresh_candidates(),
+        db.get_credit_usage(now)
+    )
+    budget = scheduler.get_budget(usage, now)
+    return {
+        'budget': budget,
+        'watched': len(watches),
+        'credits_per_refresh': scheduler.credits_for(len(watches)),
+        'interval': scheduler.get_interval(len(watches), budget)
+    }
+
+
+@app.get('/cache/stats')
+async def get_cache_stats():
+    """
+    This function reports how often quotes have been served from the quote cache
+    instead of the CoinMarketCap API.
+
+    :return: The quote cache's hit, miss, coalesce and stale counts, and its
+    size.
+    """
+    return coin_api.quote_cache.stats()
+
+
+@app.get('/metrics')
+async def get_metrics():
+    """
+    This function reports the server's metrics in the Prometheus text format:
+    request latencies per route, the time spent in each database and
+    CoinMarketCap API function, upstream request counts, credits spent, quote
+    cache effectiveness, and the durations of the Celery tasks.
+
+    :return: The metrics, as plain text.
+    """
+    usage, runs = await asyncio.gather(
+        db.get_credit_usage(datetime.utcnow()),
+        db.get_task_runs()
+    )
+    shared = metrics.Registry()
+    for period, credits in usage.items():
+        shared.set('coinroll_credits_used', credits, period=period)
+    stats = coin_api.quote_cache.stats()
+    for name in ('hits', 'misses', 'coalesced', 'stale'):
+        shared.set(f'coinroll_quote_cache_{name}_total', stats[name],
+                   kind='counter')
+    shared.set('coinroll_quote_cache_size', stats['size'])
+    lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+    hit_ratio = stats['hits'] / lookups if lookups else None
+    shared.set('coinroll_quote_cache_hit_ratio', hit_ratio)
+    shared.set('coinroll_circuit_open', int(coin_api.breaker.state != 'closed'))
+    for run in runs:
+        shared.set_summary('coinroll_task_seconds', run['recent'],
+                           run['count'], run['total'], task=run['name'])
+        shared.set('coinroll_task_failures_total', run['failures'],
+                   kind='counter', task=run['name'])
+    body = metrics.registry.render() + shared.render()
+    return PlainTextResponse(body, media_type='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
-    uvicorn.run(app, port=8000, host='0.0.0.0')
+    if not db.run_maintenance(sys.argv[1:]):
+        uvicorn.run(app, port=8000, host='0.0.0.0')
@@ -0,0 +1,79 @@
+#! python3
+
+# PSL Imports
+import asyncio
+
+
+class Broadcaster:
+    """
+    Broadcaster fans messages out to every subscriber in the process. Each
+    subscriber has its own bounded queue, and a subscriber that falls behind
+    loses its oldest messages rather than holding up the others.
+
+    :param max_queued: The maximum number of messages queued per subscriber.
+    """
+
+    def __init__(self, max_queued=10):
+        self.max_queued = max_queued
+        self.__queues = set()
+
+    def __len__(self):
+        return len(self.__queues)
+
+    def subscribe(self):
+        """
+        This function adds a subscriber.
+
+        :param self: The Broadcaster object.
+        :return: The queue the subscriber's messages will be put on.
+        """
+        queue = asyncio.Queue(maxsize=self.max_queued)
+        self.__queues.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        """
+        This function removes a subscriber.
+
+        :param self: The Broadcaster object.
+        :param queue: The queue returned when the subscriber subscribed.
+        :return: None
+        """
+        self.__queues.discard(queue)
+
+    def publish(self, message):
+        """
+        This function puts a message on every subscriber's queue.
+
+        :param self: The Broadcaster object.
+        :param message: The message to send.
+        :return: None
+        """
+        for queue in self.__queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+
+def diff_watches(snapshot, watches):
+    """
+    This function finds the fields of each Watch that have changed since they
+    were last seen, and records the new values in the snapshot.
+
+    :param snapshot: The last seen fields of each Watch, keyed by CoinMarketCap
+    API market ID. It is updated in place.
+    :param watches: The current fields of the Watches to compare.
+    :return: A list of the changed fields of each Watch that changed, along with
+    its market ID.
+    """
+    changes = []
+    for watch in watches:
+        previous = snapshot.setdefault(watch['market_id'], {})
+        changed = {
+            k: v for k, v in watch.items()
+            if k != 'last_updated' and previous.get(k) != v
+        }
+        previous.update(watch)
+        if changed:
+            changes.append({**changed, 'market_id': watch['market_id']})
+    return changes
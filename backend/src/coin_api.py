@@ -1,21 +1,79 @@
 #! python3
 
 # PSL Imports
-# import asyncio
+from contextlib import asynccontextmanager
+from math import ceil
+import asyncio
+import time
 
 # 3p Imports
 import aiohttp
-import requests
 
 # Internal Imports
 try:
     from src.config import api_key as key
 except Exception as e:
     print(e)
+from src.quote_cache import QuoteCache
+from src.resilience import CircuitBreaker, UpstreamError
+from src.scheduler import credits_for
+import src.metrics as metrics
+import src.resilience as resilience
+import src.settings as settings
+
+
+__client = {
+    'session': None,
+    'loop': None,
+    'base_url': None
+}
+
+
+credit_listeners = []
+quote_cache = QuoteCache(
+    ttl=settings.get('quote_cache_ttl'),
+    max_size=settings.get('quote_cache_size')
+)
+breaker = CircuitBreaker(
+    failure_threshold=settings.get('breaker_failure_threshold'),
+    reset_timeout=settings.get('breaker_reset_timeout')
+)
+
+
+class CoinApiError(UpstreamError):
+    """
+    CoinApiError is raised when the CoinMarketCap API answers a request with an
+    error, or with a response that holds no data.
+    """
+
+
+def __make_session():
+    connector = aiohttp.TCPConnector(
+        limit=settings.get('api_pool_size'),
+        ttl_dns_cache=settings.get('api_dns_cache_ttl'),
+        keepalive_timeout=settings.get('api_keepalive_timeout')
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=settings.get('api_timeout'),
+        connect=settings.get('api_connect_timeout')
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+@asynccontextmanager
+async def __open_session():
+    loop = asyncio.get_running_loop()
+    session = __client['session']
+    if session and not session.closed and __client['loop'] is loop:
+        yield session
+    else:
+        async with __make_session() as session:
+            yield session
 
 
 def __construct_url(endpoint):
-    return f'https://pro-api.coinmarketcap.com/v1/cryptocurrency/{endpoint}'
+    base_url = __client['base_url'] or settings.get('api_base_url')
+    return f'{base_url}/v1/cryptocurrency/{endpoint}'
 
 
 def __get_headers():
@@ -59,7 +117,57 @@ def __transform_metadata(coin):
     }
 
 
-def get_coin_listing():
+async def start_session(base_url=None):
+    """
+    This function opens the shared HTTP session used for every request to the
+    CoinMarketCap API, so that connections are pooled and kept alive between
+    requests instead of being renegotiated each time.
+
+    :param base_url: An optional base URL to send requests to instead of the
+    configured one, such as a local stand-in server used for testing.
+    :return: None
+    """
+    await close_session()
+    __client['session'] = __make_session()
+    __client['loop'] = asyncio.get_running_loop()
+    __client['base_url'] = base_url
+
+
+async def close_session():
+    """
+    This function closes the shared HTTP session, if one is open.
+
+    :return: None
+    """
+    session = __client['session']
+    __client['session'] = None
+    __client['loop'] = None
+    __client['base_url'] = None
+    if session and not session.closed:
+        await session.close()
+
+
+def __count_request(endpoint, started, outcome):
+    metrics.registry.observe('coinroll_upstream_request_seconds',
+                             time.perf_counter() - started, endpoint=endpoint)
+    metrics.registry.increment('coinroll_upstream_requests_total',
+                               endpoint=endpoint, outcome=outcome)
+
+
+def __read_data(status, headers, body):
+    if status == 200 and isinstance(body, dict) and 'data' in body:
+        return body['data']
+    error = body.get('status', {}) if isinstance(body, dict) else {}
+    message = error.get('error_message') or f'HTTP {status} with no data'
+    try:
+        retry_after = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        retry_after = None
+    raise CoinApiError(message, status=status, retry_after=retry_after)
+
+
+@metrics.span('coin_api')
+async def get_coin_listing():
     """
     This function retrieves a complete list of all available cryptocurrencies on
     the market from the MarketCoinCap API.
@@ -68,40 +176,187 @@ def get_coin_listing():
     """
     url = __construct_url('map')
     h = __get_headers()
-    listing = requests.get(url, params={}, headers=h).json()['data']
+
+    async def request(session):
+        started = time.perf_counter()
+        try:
+            async with session.get(url, headers=h) as response:
+                body = await response.json(content_type=None)
+                data = __read_data(response.status, response.headers, body)
+        except Exception:
+            __count_request('map', started, 'error')
+            raise
+        __count_request('map', started, 'ok')
+        return data
+
+    async with __open_session() as session:
+        listing = await __call_upstream(lambda: request(session))
+    # The map endpoint is charged one credit per 5,000 cryptocurrencies listed.
+    await __spend_credits(ceil(len(listing) / 5000))
     return [__transform_coin_listing(coin) for coin in listing]
 
 
+async def __call_upstream(request):
+    hedge_delay = settings.get('api_hedge_delay')
+
+    async def attempt():
+        if hedge_delay:
+            return await resilience.hedge(request, hedge_delay)
+        return await request()
+
+    return await breaker.call(lambda: resilience.retry(
+        attempt,
+        attempts=settings.get('api_retries') + 1,
+        deadline=settings.get('api_deadline'),
+        base=settings.get('api_backoff_base'),
+        cap=settings.get('api_backoff_cap')
+    ))
+
+
+def __chunk(ids, size):
+    ids = list(dict.fromkeys(str(_id) for _id in ids))
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+async def __fetch_batches(endpoint, ids, params, transform):
+    url = __construct_url(endpoint)
+    h = __get_headers()
+    batches = __chunk(ids, settings.get('api_batch_size'))
+    semaphore = asyncio.Semaphore(settings.get('api_max_concurrency'))
+
+    spent = 0
+
+    async def request(session, p, credits):
+        # Every request the API answers with data is charged, so credits are
+        # counted per request rather than per batch: a hedged batch can be
+        # charged twice. A request cancelled because the other half of its
+        # hedge finished first has usually been sent, and is charged when the
+        # API answers it, so it is counted too.
+        nonlocal spent
+        started = time.perf_counter()
+        try:
+            async with session.get(url, params=p, headers=h) as response:
+                body = await response.json(content_type=None)
+                data = __read_data(response.status, response.headers, body)
+        except asyncio.CancelledError:
+            spent += credits
+            raise
+        except Exception:
+            __count_request(endpoint, started, 'error')
+            raise
+        __count_request(endpoint, started, 'ok')
+        spent += credits
+        return data
+
+    async def fetch(session, batch):
+        p = {**params, 'id': ','.join(batch)}
+        credits = credits_for(len(batch))
+        async with semaphore:
+            data = await __call_upstream(lambda: request(session, p, credits))
+        return [transform(c) for _, c in data.items()]
+
+    async with __open_session() as session:
+        results = await asyncio.gather(
+            *(fetch(session, batch) for batch in batches),
+            return_exceptions=True
+        )
+    data = []
+    failures = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, BaseException):
+            failures.append({'ids': batch, 'error': repr(result)})
+        else:
+            data.extend(result)
+    await __spend_credits(spent)
+    return data, failures
+
+
+async def __spend_credits(credits):
+    if not credits:
+        return
+    metrics.registry.increment('coinroll_credits_spent_total', credits)
+    for listener in credit_listeners:
+        try:
+            await listener(credits)
+        except Exception as e:
+            print(f'Could not record {credits} credits spent: {e!r}')
+
+
+def __report_failures(endpoint, failures):
+    for failure in failures:
+        count = len(failure['ids'])
+        print(f'Request to {endpoint} failed for {count} IDs: {failure["error"]}')
+
+
+@metrics.span('coin_api')
+async def fetch_coin_metadata(ids):
+    """
+    This function retrieves the metadata for a list of cryptocurrencies,
+    splitting the IDs into batches of at most 100 (the most a single credit
+    covers) and requesting the batches concurrently.
+
+    :param ids: A list of IDs (each corresponding to the ID from the
+    MarketCoinCap API used for this project).
+    :return: The metadata for the cryptocurrencies in every successful batch,
+    and a list of the batches that failed along with their errors.
+    """
+    return await __fetch_batches('info', ids, {}, __transform_metadata)
+
+
+@metrics.span('coin_api')
 async def get_coin_metadata(ids):
     """
-    This function retrieves the metadata for a list of cryptocurrencies.
+    This function retrieves the metadata for a list of cryptocurrencies. Batches
+    that fail are reported and left out of the result.
 
     :param ids: A list of IDs (each corresponding to the ID from the
     MarketCoinCap API used for this project).
     :return: The metadata for the requested cryptocurrencies.
     """
-    url = __construct_url('info')
-    h = __get_headers()
-    p = {'id': ','.join(ids)}
-    async with aiohttp.ClientSession() as session:
-        metadata_response = await session.get(url, params=p, headers=h)
-        metadata = await metadata_response.json()
-    return [__transform_metadata(m) for _, m in metadata['data'].items()]
+    metadata, failures = await fetch_coin_metadata(ids)
+    __report_failures('info', failures)
+    return metadata
+
+
+@metrics.span('coin_api')
+async def fetch_coin_quotes(ids):
+    """
+    This function retrieves current price information for a list of
+    cryptocurrencies directly from the CoinMarketCap API, splitting the IDs into
+    batches of at most 100 (the most a single credit covers) and requesting the
+    batches concurrently.
+
+    :param ids: A list of IDs (each corresponding to the ID from the
+    MarketCoinCap API used for this project).
+    :return: The price information for the cryptocurrencies in every successful
+    batch, and a list of the batches that failed along with their errors.
+    """
+    p = {'convert': 'USD'}
+    return await __fetch_batches('quotes/latest', ids, p, __transform_coin_quote)
+
 
+async def __fetch_coin_quotes(ids):
+    quotes, failures = await fetch_coin_quotes(ids)
+    __report_failures('quotes/latest', failures)
+    return quotes
 
+
+@metrics.span('coin_api')
 async def get_coin_quotes(ids):
     """
     This function retrieves current price information for a list of
-    cryptocurrencies.
+    cryptocurrencies. Recently retrieved quotes are served from the quote cache,
+    and IDs that are already being retrieved for another caller share that
+    request. If the CoinMarketCap API can't be reached, the last quotes
+    retrieved for the cryptocurrencies are returned instead.
 
     :param ids: A list of IDs (each corresponding to the ID from the
     MarketCoinCap API used for this project).
     :return: The price information for the requested cryptocurrencies.
     """
-    url = __construct_url('quotes/latest')
-    h = __get_headers()
-    p = {'id': ','.join(ids), 'convert': 'USD'}
-    async with aiohttp.ClientSession() as session:
-        coins_response = await session.get(url, params=p, headers=h)
-        coins = await coins_response.json()
-    return [__transform_coin_quote(c) for _, c in coins['data'].items()]
+    quotes = await quote_cache.get_many(ids, __fetch_coin_quotes)
+    found = {str(quote['id']) for quote in quotes}
+    missing = [_id for _id in ids if str(_id) not in found]
+    if missing:
+        quotes.extend(quote_cache.get_stale(missing))
+    return quotes
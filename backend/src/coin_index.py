@@ -0,0 +1,108 @@
+#! python3
+
+# PSL Imports
+from bisect import bisect_left
+from difflib import get_close_matches
+
+
+class CoinIndex:
+    """
+    CoinIndex holds the list of available cryptocurrencies in memory, so that
+    they can be found by name, ticker symbol or market ID without querying the
+    database. Names and symbols are matched case-insensitively.
+
+    :param coins: The cryptocurrencies to index, as jsonified Coin objects.
+    """
+
+    def __init__(self, coins=()):
+        self.load(coins)
+
+    def load(self, coins):
+        """
+        This function replaces the contents of the index.
+
+        :param self: The CoinIndex object.
+        :param coins: The cryptocurrencies to index, as jsonified Coin objects.
+        :return: None
+        """
+        by_id = {}
+        by_name = {}
+        by_symbol = {}
+        by_initial = {}
+        for coin in sorted(coins, key=lambda c: c['market_id']):
+            by_id[coin['market_id']] = coin
+            by_name.setdefault(coin['name'].lower(), coin)
+            by_symbol.setdefault(coin['symbol'].lower(), coin)
+        self.__by_id = by_id
+        self.__by_name = by_name
+        self.__by_symbol = by_symbol
+        for name in by_name:
+            by_initial.setdefault(name[0], []).append(name)
+        self.__by_initial = by_initial
+        self.__keys = sorted(
+            [(name, coin['market_id']) for name, coin in by_name.items()] +
+            [(symbol, coin['market_id']) for symbol, coin in by_symbol.items()]
+        )
+
+    def __len__(self):
+        return len(self.__by_id)
+
+    def resolve(self, query):
+        """
+        This function finds the cryptocurrency a query refers to, checking names
+        first, then ticker symbols, then market IDs. Where several
+        cryptocurrencies share a name or symbol, the one with the lowest market
+        ID is used.
+
+        :param self: The CoinIndex object.
+        :param query: A name, ticker symbol or market ID.
+        :return: The jsonified Coin, or None if nothing matches.
+        """
+        key = str(query).strip().lower()
+        coin = self.__by_name.get(key) or self.__by_symbol.get(key)
+        if not coin and key.isdigit():
+            coin = self.__by_id.get(int(key))
+        return coin
+
+    def __candidates(self, key):
+        # get_close_matches keeps names whose similarity ratio, 2 * matches /
+        # (len(key) + len(name)), is at least 0.6, which no name under a
+        # quarter or over four times the length of the key can reach.
+        shortest, longest = len(key) / 4, len(key) * 4
+        return [
+            name for name in self.__by_initial.get(key[0], ())
+            if shortest <= len(name) <= longest
+        ]
+
+    def search(self, query, limit=10):
+        """
+        This function finds the cryptocurrencies whose name or ticker symbol
+        starts with a query. If there are none, it looks for cryptocurrencies
+        whose names are close to the query, comparing it only with names that
+        start with the same character and are near enough in length to be
+        close.
+
+        :param self: The CoinIndex object.
+        :param query: The start of a name or ticker symbol.
+        :param limit: The maximum number of cryptocurrencies to return.
+        :return: A list of jsonified Coins, best matches first.
+        """
+        key = query.strip().lower()
+        if not key:
+            return []
+        found = {}
+        exact = self.resolve(key)
+        if exact:
+            found[exact['market_id']] = exact
+        i = bisect_left(self.__keys, (key,))
+        while len(found) < limit and i < len(self.__keys):
+            name, market_id = self.__keys[i]
+            if not name.startswith(key):
+                break
+            found.setdefault(market_id, self.__by_id[market_id])
+            i += 1
+        if not found:
+            for name in get_close_matches(key, self.__candidates(key), n=limit):
+                coin = self.__by_name[name]
+                found.setdefault(coin['market_id'], coin)
+        return list(found.values())[:limit]
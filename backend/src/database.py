@@ -1,10 +1,18 @@
 #! python3
 
 # PSL Imports
-from datetime import datetime
-# import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from functools import partial, wraps
+import asyncio
+import time
 
 # 3p Imports
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError
 import mongoengine as db
 
 # Internal Imports
@@ -13,6 +21,13 @@ try:
     import src.coin_api as coin_api
 except Exception as e:
     print(e)
+import src.metrics as metrics
+import src.portfolio as portfolio
+import src.portfolio_vectorized as portfolio_vectorized
+import src.settings as settings
+
+
+NAME_COLLATION = {'locale': 'en', 'strength': 2}
 
 
 class Coin(db.Document):
@@ -26,6 +41,13 @@ class Coin(db.Document):
     market_id = db.IntField()
     name = db.StringField()
     symbol = db.StringField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id'], 'unique': True},
+            {'fields': ['name'], 'collation': NAME_COLLATION}
+        ]
+    }
 
     def to_json(self):
         """
@@ -60,6 +82,13 @@ class Transaction(db.Document):
     transaction_time = db.DateTimeField()
     price_in_usd = db.FloatField()
     quantity = db.IntField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            ('market_id', 'transaction_time', 'id'),
+            ('transaction_time', 'id')
+        ]
+    }
 
     def to_json(self):
         """
@@ -98,6 +127,8 @@ class Watch(db.Document):
     :param week_change: The cryptocurrency's percent change over the past week.
     :param last_updated: The timestamp of the cryptocurrency's last update in
     the database.
+    :param last_viewed: The timestamp of the last time the user requested
+    information about the cryptocurrency.
     """
     market_id = db.IntField()
     name = db.StringField()
@@ -112,6 +143,14 @@ class Watch(db.Document):
     day_change = db.FloatField()
     week_change = db.FloatField()
     last_updated = db.DateTimeField()
+    last_viewed = db.DateTimeField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id'], 'unique': True},
+            'last_updated'
+        ]
+    }
 
     def to_json(self):
         """
@@ -136,60 +175,704 @@ class Watch(db.Document):
             'last_updated': self.last_updated
         }
 
+    def to_quote(self):
+        """
+        This function converts the Watch object into the same shape as a quote
+        from the CoinMarketCap API.
+
+        :param self: The Watch object.
+        :return: The Watch object's price information as a quote.
+        """
+        return {
+            'id': self.market_id,
+            'name': self.name,
+            'supply': self.supply,
+            'cap': self.cap,
+            'price': self.price,
+            'volume': self.volume,
+            'percent_changes': {
+                'hour': self.hour_change,
+                'day': self.day_change,
+                'week': self.week_change
+            }
+        }
+
+
+class Lot(db.EmbeddedDocument):
+    """
+    Lot represents a block of a cryptocurrency that was purchased at a single
+    price and has not been sold yet.
+
+    :param quantity: The quantity of the cryptocurrency still held in the lot.
+    :param price: The price in USD the lot was purchased at.
+    """
+    quantity = db.IntField()
+    price = db.FloatField()
+
+
+class Position(db.Document):
+    """
+    Position represents the user's current holdings of a cryptocurrency as it is
+    stored in the database. It is kept up to date as transactions are created,
+    so that summaries never need to replay the transaction history.
+
+    :param market_id: The CoinMarketCap API market ID for the coin.
+    :param name: The common name for the cryptocurrency.
+    :param lots: The open FIFO lots, oldest first.
+    :param current_coins: The quantity of the cryptocurrency currently held.
+    :param usd_invested: The total USD spent purchasing the cryptocurrency.
+    :param total_coin_profit: The profit realized by selling the cryptocurrency.
+    :param version: A counter bumped on every write, used to detect concurrent
+    updates.
+    :param last_updated: The timestamp of the position's last update.
+    """
+    market_id = db.IntField()
+    name = db.StringField()
+    lots = db.EmbeddedDocumentListField(Lot)
+    current_coins = db.IntField(default=0)
+    usd_invested = db.FloatField(default=0)
+    total_coin_profit = db.FloatField(default=0)
+    version = db.IntField(default=0)
+    last_updated = db.DateTimeField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id'], 'unique': True}
+        ]
+    }
+
+    def to_position(self):
+        """
+        This function converts the Position object into a position that the
+        portfolio module can apply transactions to.
+
+        :param self: The Position object.
+        :return: The position as a dictionary of lots and running totals.
+        """
+        position = portfolio.new_position()
+        position['lots'].extend((lot.quantity, lot.price) for lot in self.lots)
+        position['current_coins'] = self.current_coins
+        position['usd_invested'] = self.usd_invested
+        position['total_coin_profit'] = self.total_coin_profit
+        return position
+
+
+class DailyRollup(db.Document):
+    """
+    DailyRollup represents the trading the user did in a cryptocurrency over a
+    single day, as it is stored in the database. Rollups are kept up to date as
+    transactions are created, so that summaries over a range of days only read
+    one document per coin per day traded.
+
+    :param market_id: The CoinMarketCap API market ID for the coin.
+    :param name: The common name for the cryptocurrency.
+    :param day: The day (at midnight UTC) the rollup covers.
+    :param units_bought: The quantity of the cryptocurrency purchased.
+    :param units_sold: The quantity of the cryptocurrency sold.
+    :param usd_invested: The USD spent purchasing the cryptocurrency.
+    :param usd_received: The USD received selling the cryptocurrency.
+    :param total_coin_profit: The profit realized selling the cryptocurrency.
+    :param closing_coins: The quantity of the cryptocurrency held at the end of
+    the day.
+    """
+    market_id = db.IntField()
+    name = db.StringField()
+    day = db.DateTimeField()
+    units_bought = db.IntField(default=0)
+    units_sold = db.IntField(default=0)
+    usd_invested = db.FloatField(default=0)
+    usd_received = db.FloatField(default=0)
+    total_coin_profit = db.FloatField(default=0)
+    closing_coins = db.IntField(default=0)
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id', 'day'], 'unique': True},
+            'day'
+        ]
+    }
+
+    def to_json(self):
+        """
+        This function converts the DailyRollup object into json.
+
+        :param self: The DailyRollup object.
+        :return: The jsonified DailyRollup object.
+        """
+        return {
+            'market_id': self.market_id,
+            'name': self.name,
+            'day': self.day,
+            'units_bought': self.units_bought,
+            'units_sold': self.units_sold,
+            'usd_invested': self.usd_invested,
+            'usd_received': self.usd_received,
+            'total_coin_profit': self.total_coin_profit,
+            'closing_coins': self.closing_coins
+        }
+
+
+class PriceBucket(db.Document):
+    """
+    PriceBucket holds every price recorded for a cryptocurrency by the watchlist
+    refresh during a single hour, as it is stored in the database. Buckets are
+    removed automatically once they pass their expiry time, which is set by the
+    raw history retention when the bucket is created.
+
+    :param market_id: The CoinMarketCap API market ID for the coin.
+    :param hour: The start of the hour the bucket covers.
+    :param times: The time each price was recorded.
+    :param prices: The prices recorded, in USD.
+    :param count: The number of prices in the bucket.
+    :param expires_at: The time the bucket will be removed.
+    """
+    market_id = db.IntField()
+    hour = db.DateTimeField()
+    times = db.ListField(db.DateTimeField())
+    prices = db.ListField(db.FloatField())
+    count = db.IntField(default=0)
+    expires_at = db.DateTimeField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id', 'hour'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+
+class PriceAggregate(db.Document):
+    """
+    PriceAggregate summarizes the prices recorded for a cryptocurrency over one
+    minute, hour or day, as it is stored in the database. Aggregates are removed
+    automatically once they pass their expiry time, which depends on their
+    resolution.
+
+    :param market_id: The CoinMarketCap API market ID for the coin.
+    :param resolution: The length of the period - 1m, 1h or 1d.
+    :param start: The start of the period.
+    :param open: The first price recorded in the period.
+    :param high: The highest price recorded in the period.
+    :param low: The lowest price recorded in the period.
+    :param close: The last price recorded in the period.
+    :param total: The sum of the prices recorded in the period.
+    :param count: The number of prices recorded in the period.
+    :param expires_at: The time the aggregate will be removed.
+    """
+    market_id = db.IntField()
+    resolution = db.StringField(choices=('1m', '1h', '1d'))
+    start = db.DateTimeField()
+    open = db.FloatField()
+    high = db.FloatField()
+    low = db.FloatField()
+    close = db.FloatField()
+    total = db.FloatField()
+    count = db.IntField()
+    expires_at = db.DateTimeField()
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['market_id', 'resolution', 'start'], 'unique': True},
+            {'fields': ['expires_at'], 'expireAfterSeconds': 0}
+        ]
+    }
+
+    def to_json(self):
+        """
+        This function converts the PriceAggregate object into json.
+
+        :param self: The PriceAggregate object.
+        :return: The jsonified PriceAggregate object.
+        """
+        return {
+            'start': self.start,
+            'open': self.open,
+            'high': self.high,
+            'low': self.low,
+            'close': self.close,
+            'average': self.total / self.count,
+            'count': self.count
+        }
+
 
+class CreditLedger(db.Document):
+    """
+    CreditLedger records the CoinMarketCap API credits spent over a day or a
+    month, as it is stored in the database.
+
+    :param period: The period the ledger covers - day or month.
+    :param key: The date (YYYY-MM-DD) or month (YYYY-MM) the ledger covers.
+    :param credits: The credits spent in the period.
+    """
+    period = db.StringField(choices=('day', 'month'))
+    key = db.StringField()
+    credits = db.IntField(default=0)
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['period', 'key'], 'unique': True}
+        ]
+    }
+
+
+class TaskRun(db.Document):
+    """
+    TaskRun records how many times a Celery task has run and how long its runs
+    took, as it is stored in the database, so that the API process can report
+    the durations of tasks run by the workers.
+
+    :param name: The name of the task.
+    :param count: The number of runs.
+    :param failures: The number of runs that raised an exception.
+    :param total: The total duration of every run, in seconds.
+    :param recent: The durations of the most recent runs, in seconds.
+    """
+    name = db.StringField(required=True)
+    count = db.IntField(default=0)
+    failures = db.IntField(default=0)
+    total = db.FloatField(default=0.0)
+    recent = db.ListField(db.FloatField())
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            {'fields': ['name'], 'unique': True}
+        ]
+    }
+
+
+def __ledger_keys(now):
+    return {'day': now.strftime('%Y-%m-%d'), 'month': now.strftime('%Y-%m')}
+
+
+def __position_fields(position):
+    return {
+        'lots': [Lot(quantity=q, price=p) for q, p in position['lots']],
+        'current_coins': position['current_coins'],
+        'usd_invested': position['usd_invested'],
+        'total_coin_profit': position['total_coin_profit'],
+        'last_updated': datetime.utcnow()
+    }
+
+
+__ROLLUP_TOTALS = (
+    'units_bought', 'units_sold', 'usd_invested', 'usd_received',
+    'total_coin_profit'
+)
+
+
+class InsufficientCoinsError(ValueError):
+    """
+    InsufficientCoinsError is raised when a sell is for more coins than are
+    held at the moment it is recorded.
+
+    :param record: The transaction record of the sell.
+    :param trade: The index of the sell among the trades made with it, if it
+    was one of several.
+    """
+
+    def __init__(self, record, trade=None):
+        super().__init__('Insufficient coins.')
+        self.record = record
+        self.trade = trade
+
+
+def __apply_to_position(records):
+    record = records[0]
+    while True:
+        stored = Position.objects(market_id=record['market_id']).first()
+        if stored:
+            position = stored.to_position()
+        else:
+            position = portfolio.new_position()
+        rollups = {}
+        for r in records:
+            selling = r['quantity'] if r['type'] == 'sell' else 0
+            if position['current_coins'] < selling:
+                raise InsufficientCoinsError(r)
+            profit = portfolio.apply_transaction(position, r)
+            portfolio.add_to_rollup(
+                rollups, r, profit, position['current_coins']
+            )
+        fields = __position_fields(position)
+        applied = {
+            'market_id': record['market_id'],
+            'version': stored.version + 1 if stored else 1,
+            'previous': stored.to_position() if stored else None,
+            'rollups': rollups
+        }
+        if not stored:
+            try:
+                Position(
+                    market_id = record['market_id'],
+                    name = record['name'],
+                    version = 1,
+                    **fields
+                ).save(force_insert=True)
+                return applied
+            except db.NotUniqueError:
+                continue
+        updates = {f'set__{k}': v for k, v in fields.items()}
+        current = Position.objects(
+            market_id=record['market_id'],
+            version=stored.version
+        )
+        if current.update_one(inc__version=1, **updates):
+            return applied
+
+
+def __update_position(records):
+    applied = __apply_to_position(records)
+    __update_rollups(applied['rollups'].values())
+
+
+def __revert_position(applied):
+    # Undoes a position update whose records were never saved. If another
+    # update has been made on top of it, the position is replayed from the
+    # saved records instead, which leaves the unsaved ones out.
+    _id = applied['market_id']
+    while True:
+        stored = Position.objects(market_id=_id).first()
+        if stored is None:
+            return
+        if stored.version == applied['version']:
+            position = applied['previous'] or portfolio.new_position()
+        else:
+            records = Transaction.objects(market_id=_id).order_by(
+                'transaction_time', 'id'
+            )
+            position = portfolio.get_position(r.to_json() for r in records)
+        updates = {
+            f'set__{k}': v for k, v in __position_fields(position).items()
+        }
+        current = Position.objects(market_id=_id, version=stored.version)
+        if current.update_one(inc__version=1, **updates):
+            return
+
+
+def __update_rollups(rollups):
+    operations = [
+        UpdateOne(
+            {'market_id': r['market_id'], 'day': r['day']},
+            {
+                '$inc': {k: r[k] for k in __ROLLUP_TOTALS},
+                '$set': {'closing_coins': r['closing_coins']},
+                '$setOnInsert': {'name': r['name']}
+            },
+            upsert=True
+        )
+        for r in rollups
+    ]
+    DailyRollup._get_collection().bulk_write(operations, ordered=False)
+
+
+@metrics.span('database')
+def rebuild_positions():
+    """
+    This function recomputes every Position and DailyRollup in the database from
+    the complete Transaction history. It is used to repair them if they have
+    fallen out of step with the transaction records. The history is replayed by
+    the engine the portfolio_engine setting selects.
+
+    :return: The number of positions rebuilt.
+    """
+    records = [
+        record.to_json() for record in
+        Transaction.objects().order_by('transaction_time', 'id')
+    ]
+    if settings.get('portfolio_engine') == 'vectorized':
+        positions, outcomes = portfolio_vectorized.replay(records)
+    else:
+        positions, outcomes = portfolio.replay(records)
+    names = {}
+    rollups = {}
+    for record, (profit, closing_coins) in zip(records, outcomes):
+        names.setdefault(record['market_id'], record['name'])
+        portfolio.add_to_rollup(rollups, record, profit, closing_coins)
+    DailyRollup.objects().delete()
+    if rollups:
+        DailyRollup.objects.insert(
+            [DailyRollup(**r) for r in rollups.values()], load_bulk=False
+        )
+    Position.objects().delete()
+    documents = [
+        Position(market_id=_id, name=names[_id], version=1,
+                 **__position_fields(position))
+        for _id, position in positions.items()
+    ]
+    if documents:
+        Position.objects.insert(documents)
+    print(f'Rebuilt {len(documents)} portfolio positions and '
+          f'{len(rollups)} daily rollups.')
+    return len(documents)
+
+
+__executor = ThreadPoolExecutor(
+    max_workers=settings.get('db_max_workers'),
+    thread_name_prefix='database'
+)
+
+
+def __offload(function):
+    timed = metrics.span('database')(function)
+
+    @wraps(function)
+    async def offloaded(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        call = partial(timed, *args, **kwargs)
+        return await loop.run_in_executor(__executor, call)
+    return offloaded
+
+
+__PRICE_FIELDS = (
+    'supply', 'cap', 'price', 'volume', 'hour_change', 'day_change', 'week_change'
+)
+
+
+def __chunk(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+@metrics.span('database')
 def update_coin_list(data):  # tasks
     """
     This function updates the Coin collection in the database with a current map
     of all cryptocurrencies currently available on the market, per the
-    CoinMarketCap API this project uses.
+    CoinMarketCap API this project uses. Only cryptocurrencies that are new or
+    have changed since the last update are written, using unordered bulk upserts
+    sent in chunks.
 
     :param data: The list of cryptocurrencies currently available.
-    :return: None
+    :return: The number of Coins inserted, updated and left unchanged.
     """
+    collection = Coin._get_collection()
+    projection = {'_id': 0, 'market_id': 1, 'name': 1, 'symbol': 1}
+    stored = {
+        c['market_id']: (c.get('name'), c.get('symbol'))
+        for c in collection.find({}, projection)
+    }
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    operations = []
     for x in data:
-        coin = Coin(
-            market_id = x['id'],
-            name = x['name'],
-            symbol = x['symbol']
-        )
-        new = Coin.objects(market_id=coin.market_id)
-        new.update(name=coin.name, symbol=coin.symbol, upsert=True)
-    print('Database updated with all available cryptocurrencies.')
+        current = stored.get(x['id'])
+        if current == (x['name'], x['symbol']):
+            counts['unchanged'] += 1
+            continue
+        counts['updated' if current else 'inserted'] += 1
+        operations.append(UpdateOne(
+            {'market_id': x['id']},
+            {'$set': {'name': x['name'], 'symbol': x['symbol']}},
+            upsert=True
+        ))
+    for chunk in __chunk(operations, settings.get('coin_list_chunk_size')):
+        collection.bulk_write(chunk, ordered=False)
+    print('Database updated with all available cryptocurrencies: '
+          f'{counts["inserted"]} inserted, {counts["updated"]} updated, '
+          f'{counts["unchanged"]} unchanged.')
+    return counts
+
 
+def __watch_price_fields(quote):
+    fields = {
+        'supply': quote['supply'],
+        'cap': quote['cap'],
+        'price': quote['price'],
+        'volume': quote['volume'],
+        'hour_change': quote['percent_changes']['hour'],
+        'day_change': quote['percent_changes']['day'],
+        'week_change': quote['percent_changes']['week']
+    }
+    # CoinMarketCap sends null for the prices of some new or illiquid coins,
+    # which is stored as it is rather than converted.
+    return {
+        k: v if v is None else Watch._fields[k].to_mongo(v)
+        for k, v in fields.items()
+    }
 
-async def update_watchlist(quotes):  # tasks
+
+@__offload
+def update_watchlist(quotes):  # tasks
     """
     This function updates the user's watchlist with recent financial information
-    for each cryptocurrency they're currently watching.
+    for each cryptocurrency they're currently watching. Every change is sent in
+    a single bulk write, and cryptocurrencies whose prices haven't changed only
+    have their update time refreshed.
+
+    :param quotes: The financial information received from the CoinMarketCap
+    API.
+    :return: The number of Watches written and left unchanged, and the time the
+    update took in seconds.
+    """
+    started = time.perf_counter()
+    collection = Watch._get_collection()
+    projection = {'_id': 0, 'market_id': 1, **{k: 1 for k in __PRICE_FIELDS}}
+    ids = [quote['id'] for quote in quotes]
+    stored = {
+        w['market_id']: w
+        for w in collection.find({'market_id': {'$in': ids}}, projection)
+    }
+    now = datetime.utcnow()
+    operations = []
+    unchanged = []
+    for quote in quotes:
+        current = stored.get(quote['id'])
+        if current is None:
+            continue
+        fields = __watch_price_fields(quote)
+        if all(current.get(k) == v for k, v in fields.items()):
+            unchanged.append(quote['id'])
+            continue
+        operations.append(UpdateOne(
+            {'market_id': quote['id']},
+            {'$set': {**fields, 'last_updated': now}}
+        ))
+    written = len(operations)
+    if unchanged:
+        operations.append(UpdateMany(
+            {'market_id': {'$in': unchanged}},
+            {'$set': {'last_updated': now}}
+        ))
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return {
+        'written': written,
+        'unchanged': len(unchanged),
+        'seconds': time.perf_counter() - started
+    }
+
+
+__RESOLUTIONS = {
+    '1m': (timedelta(minutes=1), 'history_minute_days'),
+    '1h': (timedelta(hours=1), 'history_hour_days'),
+    '1d': (timedelta(days=1), 'history_day_days')
+}
+
+
+def __floor_time(moment, period):
+    return datetime.min + (moment - datetime.min) // period * period
+
+
+@__offload
+def record_price_history(quotes):  # tasks
+    """
+    This function appends the latest price for each cryptocurrency to its hourly
+    PriceBucket, and folds it into the PriceAggregates for the current minute,
+    hour and day.
 
     :param quotes: The financial information received from the CoinMarketCap
     API.
     :return: None
     """
+    now = datetime.utcnow()
+    hour = __floor_time(now, timedelta(hours=1))
+    bucket_expires_at = hour + timedelta(days=settings.get('history_raw_days'))
+    buckets = []
+    aggregates = []
     for quote in quotes:
-        Watch.objects(market_id=quote['id']).update(
-            supply = quote['supply'],
-            cap = quote['cap'],
-            price = quote['price'],
-            volume = quote['volume'],
-            hour_change = quote['percent_changes']['hour'],
-            day_change = quote['percent_changes']['day'],
-            week_change = quote['percent_changes']['week'],
-            last_updated = datetime.utcnow()
-        )
+        price = quote['price']
+        if price is None:
+            continue
+        buckets.append(UpdateOne(
+            {'market_id': quote['id'], 'hour': hour},
+            {
+                '$setOnInsert': {'expires_at': bucket_expires_at},
+                '$push': {'times': now, 'prices': price},
+                '$inc': {'count': 1}
+            },
+            upsert=True
+        ))
+        for resolution, (period, retention) in __RESOLUTIONS.items():
+            start = __floor_time(now, period)
+            expires_at = start + timedelta(days=settings.get(retention))
+            aggregates.append(UpdateOne(
+                {'market_id': quote['id'], 'resolution': resolution,
+                 'start': start},
+                {
+                    '$setOnInsert': {'open': price, 'expires_at': expires_at},
+                    '$max': {'high': price},
+                    '$min': {'low': price},
+                    '$set': {'close': price},
+                    '$inc': {'total': price, 'count': 1}
+                },
+                upsert=True
+            ))
+    if buckets:
+        PriceBucket._get_collection().bulk_write(buckets, ordered=False)
+        PriceAggregate._get_collection().bulk_write(aggregates, ordered=False)
+
+
+@__offload
+def get_price_history(_id, resolution, start, end):
+    """
+    This function retrieves the recorded prices for a cryptocurrency over a
+    period of time, reading only the buckets or aggregates that overlap it.
+
+    :param _id: The CoinMarketCap API market ID for the coin.
+    :param resolution: raw for every recorded price, or 1m, 1h or 1d for
+    aggregates over that period.
+    :param start: The start of the period of time.
+    :param end: The end of the period of time.
+    :return: A list of prices or jsonified PriceAggregate objects, oldest
+    first.
+    """
+    if resolution != 'raw':
+        aggregates = PriceAggregate.objects(
+            market_id=_id,
+            resolution=resolution,
+            start__gte=__floor_time(start, __RESOLUTIONS[resolution][0]),
+            start__lte=end
+        ).order_by('start')
+        return [aggregate.to_json() for aggregate in aggregates]
+    buckets = PriceBucket.objects(
+        market_id=_id,
+        hour__gte=__floor_time(start, timedelta(hours=1)),
+        hour__lte=end
+    ).order_by('hour')
+    return [
+        {'time': time, 'price': price}
+        for bucket in buckets
+        for time, price in zip(bucket.times, bucket.prices)
+        if start <= time <= end
+    ]
+
+
+@__offload
+def get_coin_list():
+    """
+    This function retrieves every cryptocurrency in the database.
+
+    :return: A list of jsonified Coin objects.
+    """
+    projection = {'_id': 0, 'market_id': 1, 'name': 1, 'symbol': 1}
+    return list(Coin._get_collection().find({}, projection))
 
 
-async def get_coin_from_db(name):
+@__offload
+def get_coin_from_db(name):
     """
     This function retrieves cryptocurrency information from the database.
 
     :param name: The common name of the cryptocurrency.
     :return: The requested Coin.
     """
-    return Coin.objects(name=name).first().to_json()
+    coin = Coin.objects(name=name).collation(NAME_COLLATION).first()
+    return coin.to_json()
+
+
+@__offload
+def get_coins_from_db(names):
+    """
+    This function retrieves several cryptocurrencies from the database with a
+    single query.
+
+    :param names: A list of common names of cryptocurrencies.
+    :return: A list of jsonified Coin objects.
+    """
+    coins = Coin.objects(name__in=list(names)).collation(NAME_COLLATION)
+    return [coin.to_json() for coin in coins]
 
 
-async def get_coin_from_watchlist(_id):
+@__offload
+def get_coin_from_watchlist(_id):
     """
     This function retrieves a coin from the watchlist.
 
@@ -199,7 +882,8 @@ async def get_coin_from_watchlist(_id):
     return Watch.objects(market_id=_id).first()
 
 
-async def get_watchlist():
+@__offload
+def get_watchlist():
     """
     This function returns the user's watchlist.
 
@@ -208,17 +892,148 @@ async def get_watchlist():
     return [coin.to_json() for coin in Watch.objects()]
 
 
-async def add_watched_coin(_id, metadata, quote):
+@__offload
+def get_watch_updates(since=None):
     """
-    This function adds a cryptocurrency to the watchlist.
+    This function returns the price fields of the Watches refreshed at or after
+    a point in time. Watches refreshed at exactly that time are included, since
+    a refresh gives every Watch it writes the same time and may not have
+    finished writing them when a previous call read some of them.
+
+    :param since: The point in time, or None for every Watch.
+    :return: A list of the market_id, price fields and last_updated of each
+    Watch refreshed since then.
+    """
+    query = {} if since is None else {'last_updated': {'$gte': since}}
+    projection = {
+        '_id': 0, 'market_id': 1, 'last_updated': 1,
+        **{k: 1 for k in __PRICE_FIELDS}
+    }
+    return list(Watch._get_collection().find(query, projection))
+
+
+@__offload
+def get_refresh_candidates():
+    """
+    This function returns the fields of every Watch the watchlist refresh needs
+    to decide which cryptocurrencies are due a refresh.
+
+    :return: A list of the market_id, hour_change, last_updated and last_viewed
+    fields of each Watch.
+    """
+    projection = {
+        '_id': 0, 'market_id': 1, 'hour_change': 1, 'last_updated': 1,
+        'last_viewed': 1
+    }
+    return list(Watch._get_collection().find({}, projection))
+
+
+@__offload
+def mark_viewed(_id):
+    """
+    This function records that the user has just requested information about a
+    cryptocurrency, if it is on the watchlist.
 
     :param _id: The CoinMarketCap API market ID for the coin.
-    :param metadata: The metadata for the requested cryptocurrency.
-    :param quote: The current financial information for the requested
-    cryptocurrency.
-    :return: A confirmation that the Watch was saved to the database.
+    :return: None
+    """
+    Watch.objects(market_id=_id).update(last_viewed=datetime.utcnow())
+
+
+@__offload
+def record_credits(credits):
+    """
+    This function adds spent CoinMarketCap API credits to today's and this
+    month's ledgers.
+
+    :param credits: The number of credits spent.
+    :return: None
+    """
+    operations = [
+        UpdateOne(
+            {'period': period, 'key': key},
+            {'$inc': {'credits': credits}},
+            upsert=True
+        )
+        for period, key in __ledger_keys(datetime.utcnow()).items()
+    ]
+    CreditLedger._get_collection().bulk_write(operations, ordered=False)
+
+
+@__offload
+def get_credit_usage(now):
+    """
+    This function returns the CoinMarketCap API credits spent so far today and
+    this month.
+
+    :param now: The current time (UTC).
+    :return: The credits spent, keyed by period.
+    """
+    usage = {'day': 0, 'month': 0}
+    for period, key in __ledger_keys(now).items():
+        ledger = CreditLedger.objects(period=period, key=key).first()
+        if ledger:
+            usage[period] = ledger.credits
+    return usage
+
+
+def record_task_run(name, seconds, failed=False):  # tasks
+    """
+    This function adds a run of a Celery task to its TaskRun, keeping the
+    durations of only the most recent runs.
+
+    :param name: The name of the task.
+    :param seconds: How long the run took, in seconds.
+    :param failed: Whether the run raised an exception.
+    :return: None
+    """
+    TaskRun._get_collection().update_one(
+        {'name': name},
+        {
+            '$inc': {'count': 1, 'failures': int(failed), 'total': seconds},
+            '$push': {'recent': {
+                '$each': [seconds],
+                '$slice': -settings.get('metrics_reservoir_size')
+            }}
+        },
+        upsert=True
+    )
+
+
+@__offload
+def get_task_runs():
+    """
+    This function returns the recorded runs of every Celery task.
+
+    :return: A list of the name, count, failures, total and recent fields of
+    each TaskRun.
     """
-    watch = Watch(
+    projection = {'_id': 0, 'name': 1, 'count': 1, 'failures': 1, 'total': 1,
+                  'recent': 1}
+    return list(TaskRun._get_collection().find({}, projection))
+
+
+@__offload
+def get_watched_quotes(ids, max_age):
+    """
+    This function retrieves the prices the watchlist refresh has already stored
+    for a list of cryptocurrencies, skipping any that are too old to use.
+
+    :param ids: A list of CoinMarketCap API market IDs.
+    :param max_age: The maximum age of a stored price, in seconds.
+    :return: A list of quotes for the watched cryptocurrencies with fresh
+    prices.
+    """
+    oldest = datetime.utcnow() - timedelta(seconds=max_age)
+    watches = Watch.objects(
+        market_id__in=[int(_id) for _id in ids],
+        last_updated__gte=oldest
+    )
+    return [watch.to_quote() for watch in watches]
+
+
+def __make_watch(_id, metadata, quote):
+    return Watch(
         market_id = _id,
         name = metadata['name'],
         symbol = metadata['symbol'],
@@ -233,10 +1048,72 @@ async def add_watched_coin(_id, metadata, quote):
         week_change = quote['percent_changes']['week'],
         last_updated = datetime.utcnow()
     )
-    return watch.save()
 
 
-async def remove_watched_coin(_id):
+@__offload
+def add_watched_coin(_id, metadata, quote):
+    """
+    This function adds a cryptocurrency to the watchlist.
+
+    :param _id: The CoinMarketCap API market ID for the coin.
+    :param metadata: The metadata for the requested cryptocurrency.
+    :param quote: The current financial information for the requested
+    cryptocurrency.
+    :return: A confirmation that the Watch was saved to the database, or None
+    if the cryptocurrency was added to the watchlist by another request first.
+    """
+    try:
+        return __make_watch(_id, metadata, quote).save()
+    except db.NotUniqueError:
+        return None
+
+
+@__offload
+def add_watched_coins(metadata, quotes):
+    """
+    This function adds several cryptocurrencies to the watchlist with a single
+    insert. Cryptocurrencies that another request adds to the watchlist first
+    are reported as already watched.
+
+    :param metadata: The metadata for each cryptocurrency, keyed by
+    CoinMarketCap API market ID.
+    :param quotes: The current financial information for each cryptocurrency,
+    keyed by CoinMarketCap API market ID.
+    :return: The market IDs of the cryptocurrencies added, and of those that
+    were already being watched.
+    """
+    watches = [__make_watch(_id, metadata[_id], quotes[_id]) for _id in quotes]
+    duplicates = set()
+    if watches:
+        documents = [watch.to_mongo() for watch in watches]
+        try:
+            Watch._get_collection().insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details['writeErrors']
+            if any(error['code'] != 11000 for error in errors):
+                raise
+            duplicates = {watches[error['index']].market_id for error in errors}
+    return {
+        'added': [w.market_id for w in watches if w.market_id not in duplicates],
+        'already_watched': sorted(duplicates)
+    }
+
+
+@__offload
+def get_watched_ids(ids):
+    """
+    This function checks which of a list of cryptocurrencies are already on the
+    watchlist.
+
+    :param ids: A list of CoinMarketCap API market IDs.
+    :return: The set of those IDs that are being watched.
+    """
+    watches = Watch.objects(market_id__in=list(ids)).only('market_id')
+    return {watch.market_id for watch in watches}
+
+
+@__offload
+def remove_watched_coin(_id):
     """
     This function removes a coin from the watchlist.
 
@@ -246,16 +1123,21 @@ async def remove_watched_coin(_id):
     return Watch.objects(market_id=_id).first().delete()
 
 
-async def create_transaction(_id, quantity, quote, _type):
+@__offload
+def create_transaction(_id, quantity, quote, _type):
     """
-    This function creates a Transaction and adds it to the database.
+    This function creates a Transaction and adds it to the database. A sell is
+    checked against the holdings in the same versioned update that records it
+    in the position, so concurrent sells can't take the holdings below zero,
+    and the Transaction is only saved once that update has succeeded.
 
     :param _id: The CoinMarketCap API market ID for the coin.
     :param quantity: The amount of cryptocurrency being purchased or sold.
     :param quote: The current financial information for the requested
     cryptocurrency.
     :param _type: The Transaction type - a purchase or a sell.
-    :return: A confirmation that the Transaction was added to the database.
+    :return: A confirmation that the Transaction was added to the database, or
+    None if there weren't enough coins to sell.
     """
     transaction = Transaction(
         market_id = _id,
@@ -265,20 +1147,76 @@ async def create_transaction(_id, quantity, quote, _type):
         price_in_usd = quote['price'],
         quantity = quantity
     )
+    try:
+        __update_position([transaction.to_json()])
+    except InsufficientCoinsError:
+        return None
     return transaction.save()
 
 
-async def get_all_transactions():
+@__offload
+def create_transactions(trades):
+    """
+    This function creates several Transactions and adds them to the database
+    with a single insert. Every sell is checked against the holdings in the
+    same versioned update that records it in the position, and the
+    Transactions are only inserted once the position for each cryptocurrency
+    traded has been updated. If any sell is for more coins than are held, the
+    positions already updated are restored and nothing is inserted. The trades
+    are given times a millisecond apart (the precision MongoDB stores), so that
+    they sort in the order they were made.
+
+    :param trades: A list of trades in the order they were made, each holding
+    the CoinMarketCap API market ID, quantity, quote and Transaction type.
+    :return: A list of the jsonified Transaction objects created.
+    """
+    now = datetime.utcnow()
+    now -= timedelta(microseconds=now.microsecond % 1000)
+    transactions = [
+        Transaction(
+            market_id = t['market_id'],
+            name = t['quote']['name'],
+            type = t['type'],
+            transaction_time = now + timedelta(milliseconds=i),
+            price_in_usd = t['quote']['price'],
+            quantity = t['quantity']
+        )
+        for i, t in enumerate(trades)
+    ]
+    if not transactions:
+        return []
+    records = [transaction.to_json() for transaction in transactions]
+    by_coin = {}
+    for record in records:
+        by_coin.setdefault(record['market_id'], []).append(record)
+    applied = []
+    try:
+        for coin_records in by_coin.values():
+            applied.append(__apply_to_position(coin_records))
+    except InsufficientCoinsError as e:
+        for update in applied:
+            __revert_position(update)
+        trade = next(i for i, r in enumerate(records) if r is e.record)
+        raise InsufficientCoinsError(e.record, trade) from e
+    Transaction.objects.insert(transactions, load_bulk=False)
+    for update in applied:
+        __update_rollups(update['rollups'].values())
+    return records
+
+
+@__offload
+def get_all_transactions():
     """
     This function returns all Transactions in the database.
 
     :return: A list of all Transaction objects in the database.
     """
-    records = Transaction.objects().order_by('transaction_time')
+    records = Transaction.objects().order_by('transaction_time', 'id')
     return [record.to_json() for record in records]
 
 
-async def get_all_transactions_by_id(_id):
+@__offload
+def get_all_transactions_by_id(_id):
     """
     This function returns all Transactions in the database for a particular
     cryptocurrency.
@@ -286,10 +1224,237 @@ async def get_all_transactions_by_id(_id):
     :param _id: The CoinMarketCap API market ID for the coin.
     :return: A list of all Transaction objects for the given ID in the database.
     """
-    records = Transaction.objects(market_id=_id).order_by('transaction_time')
+    records = Transaction.objects(market_id=_id).order_by(
+        'transaction_time', 'id'
+    )
     return [record.to_json() for record in records]
 
 
+__RECORD_PROJECTION = {
+    'market_id': 1, 'name': 1, 'type': 1, 'transaction_time': 1,
+    'price_in_usd': 1, 'quantity': 1
+}
+__RECORD_ORDER = [('transaction_time', 1), ('_id', 1)]
+
+
+class InvalidCursorError(ValueError):
+    """
+    InvalidCursorError is raised when a page of Transactions is requested with a
+    cursor that wasn't returned with a previous page.
+    """
+
+
+def __encode_cursor(record):
+    key = f'{record["transaction_time"].isoformat()}|{record["_id"]}'
+    return urlsafe_b64encode(key.encode()).decode()
+
+
+def __decode_cursor(cursor):
+    try:
+        time, _id = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(time), ObjectId(_id)
+    except (ValueError, InvalidId) as e:
+        raise InvalidCursorError('Invalid cursor') from e
+
+
+def __records_query(_id, cursor=None):
+    query = {} if _id is None else {'market_id': _id}
+    if cursor:
+        time, last_id = __decode_cursor(cursor)
+        query['$or'] = [
+            {'transaction_time': {'$gt': time}},
+            {'transaction_time': time, '_id': {'$gt': last_id}}
+        ]
+    return query
+
+
+@__offload
+def get_transactions_page(_id=None, cursor=None, limit=100):
+    """
+    This function returns one page of Transactions in the database, optionally
+    for a particular cryptocurrency, ordered by transaction time. A cursor that
+    can't be decoded raises an InvalidCursorError.
+
+    :param _id: The optional CoinMarketCap API market ID for the coin.
+    :param cursor: The cursor returned with the previous page, or None for the
+    first page.
+    :param limit: The maximum number of Transactions on the page.
+    :return: The jsonified Transaction objects on the page, and the cursor for
+    the next page (None if this is the last page).
+    """
+    query = __records_query(_id, cursor)
+    found = Transaction._get_collection().find(query, __RECORD_PROJECTION)
+    records = list(found.sort(__RECORD_ORDER).limit(limit + 1))
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = __encode_cursor(records[-1])
+    for record in records:
+        del record['_id']
+    return {'records': records, 'next_cursor': next_cursor}
+
+
+def iter_transactions(_id=None):
+    """
+    This function iterates over the Transactions in the database, optionally for
+    a particular cryptocurrency, ordered by transaction time. Records are read
+    from the database in batches as they are consumed, so memory use doesn't
+    grow with the size of the history.
+
+    :param _id: The optional CoinMarketCap API market ID for the coin.
+    :return: A generator of jsonified Transaction objects.
+    """
+    projection = {'_id': 0, **__RECORD_PROJECTION}
+    found = Transaction._get_collection().find(__records_query(_id), projection)
+    yield from found.sort(__RECORD_ORDER).batch_size(1000)
+
+
+@__offload
+def get_position(_id):
+    """
+    This function returns the user's current position for a particular
+    cryptocurrency.
+
+    :param _id: The CoinMarketCap API market ID for the coin.
+    :return: The position for the given ID, or an empty position if the user
+    has never traded it.
+    """
+    stored = Position.objects(market_id=_id).first()
+    return stored.to_position() if stored else portfolio.new_position()
+
+
+@__offload
+def get_positions(ids):
+    """
+    This function returns the user's current positions for several
+    cryptocurrencies with a single query.
+
+    :param ids: A list of CoinMarketCap API market IDs.
+    :return: A dictionary of positions keyed by CoinMarketCap API market ID,
+    with an empty position for each cryptocurrency the user has never traded.
+    """
+    positions = {_id: portfolio.new_position() for _id in ids}
+    for stored in Position.objects(market_id__in=list(ids)):
+        positions[stored.market_id] = stored.to_position()
+    return positions
+
+
+@__offload
+def get_rollups(start, end):
+    """
+    This function returns the daily rollups for a range of days.
+
+    :param start: The first day in the range.
+    :param end: The last day in the range.
+    :return: A list of jsonified DailyRollup objects, ordered by day.
+    """
+    start = datetime.combine(start, datetime.min.time())
+    end = datetime.combine(end, datetime.min.time())
+    rollups = DailyRollup.objects(day__gte=start, day__lte=end).order_by('day')
+    return [rollup.to_json() for rollup in rollups]
+
+
+@__offload
+def get_all_positions():
+    """
+    This function returns all of the user's positions.
+
+    :return: A dictionary of positions keyed by CoinMarketCap API market ID.
+    """
+    return {p.market_id: p.to_position() for p in Position.objects()}
+
+
+__DOCUMENTS = (
+    Coin, Transaction, Watch, Position, DailyRollup, PriceBucket,
+    PriceAggregate, CreditLedger, TaskRun
+)
+
+
+def __migrate_price_buckets():
+    # PriceBuckets used to expire through a TTL index on their hour, fixed to
+    # the raw history retention when the index was created. That index is
+    # replaced by one on expires_at, which older buckets are given here.
+    collection = PriceBucket._get_collection()
+    if 'hour_1' in collection.index_information():
+        collection.drop_index('hour_1')
+    days = timedelta(days=settings.get('history_raw_days'))
+    found = collection.find({'expires_at': {'$exists': False}}, {'hour': 1})
+    operations = [
+        UpdateOne({'_id': b['_id']}, {'$set': {'expires_at': b['hour'] + days}})
+        for b in found
+    ]
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+
+
+def ensure_indexes():
+    """
+    This function creates any of the declared indexes that are missing from the
+    database, after moving stored PriceBuckets from the old expiry index to the
+    current one.
+
+    :return: None
+    """
+    __migrate_price_buckets()
+    for document in __DOCUMENTS:
+        document.ensure_indexes()
+
+
+def __scanned_stages(plan):
+    stages = [plan.get('stage')]
+    for key in ('inputStage', 'inputStages'):
+        children = plan.get(key, [])
+        for child in children if isinstance(children, list) else [children]:
+            stages.extend(__scanned_stages(child))
+    return stages
+
+
+def check_indexes():
+    """
+    This function reports any declared indexes that are missing from the
+    database, and any of the app's frequent queries that the database would
+    answer with a full collection scan.
+
+    :return: A list of messages describing each problem found.
+    """
+    problems = []
+    for document in __DOCUMENTS:
+        missing = document.compare_indexes()['missing']
+        if missing:
+            name = document._get_collection_name()
+            problems.append(f'{name} is missing indexes: {missing}')
+    queries = {
+        'Coin by name': Coin.objects(name='').collation(NAME_COLLATION),
+        'Transaction by market_id': Transaction.objects(market_id=0).order_by(
+            'transaction_time', 'id'
+        ),
+        'Watch by market_id': Watch.objects(market_id=0),
+        'Position by market_id': Position.objects(market_id=0)
+    }
+    for description, query in queries.items():
+        plan = query.explain()['queryPlanner']['winningPlan']
+        if 'COLLSCAN' in __scanned_stages(plan):
+            problems.append(f'{description} uses a collection scan.')
+    return problems
+
+
+def run_maintenance(args):
+    """
+    This function runs the maintenance command given on the command line, if
+    any, and prints its result.
+
+    :param args: The command line arguments, without the script name.
+    :return: True if a maintenance command was run, otherwise False.
+    """
+    if args == ['rebuild-positions']:
+        rebuild_positions()
+    elif args == ['check-indexes']:
+        print('\n'.join(check_indexes()) or 'All indexes are in place.')
+    else:
+        return False
+    return True
+
+
 def connect_to_db():
     """
     This function connects the app to the database.
@@ -303,3 +1468,6 @@ def connect_to_db():
         username=username, 
         password=password
     )
+    ensure_indexes()
+    for problem in check_indexes():
+        print(problem)
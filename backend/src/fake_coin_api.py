@@ -0,0 +1,329 @@
+#! python3
+"""
+A local stand-in for the parts of the CoinMarketCap API this app uses, so that
+the app can be load-tested and benchmarked without spending real credits. Point
+the api_base_url setting (or coin_api.start_session) at it, and run it from the
+backend directory with:
+
+    python -m src.fake_coin_api --port 8800 --coins 5000 --latency 0.05
+"""
+
+# PSL Imports
+from datetime import datetime
+from math import ceil, exp, log
+from random import Random
+import argparse
+import asyncio
+import time
+import zlib
+
+# 3p Imports
+from aiohttp import web
+
+# Internal Imports
+from src.scheduler import credits_for
+
+
+PRICE_WALK = [(60, 0.002), (3600, 0.01), (86400, 0.03), (604800, 0.08)]
+PRICE_CHANGES = {'1h': 3600, '24h': 86400, '7d': 604800}
+
+
+class FakeCoinApi:
+    """
+    FakeCoinApi simulates the CoinMarketCap API for a number of generated
+    cryptocurrencies. Prices follow a deterministic random walk, so the same
+    seed and time always give the same quote. Every request is counted against
+    a per-minute rate limit and charged credits the way CoinMarketCap charges
+    them, and requests can be slowed down or made to fail at random.
+
+    :param coins: The number of cryptocurrencies listed.
+    :param seed: The seed for prices, latency jitter and injected errors.
+    :param latency: The number of seconds every response is delayed.
+    :param jitter: The most extra seconds, chosen at random, added to the delay.
+    :param error_rate: The fraction of requests answered with a server error.
+    :param rate_limit: The number of requests allowed per minute, or None.
+    :param daily_credits: The number of credits allowed per day, or None.
+    :param clock: The function used to read the current time, in seconds since
+    the epoch.
+    """
+
+    def __init__(self, coins=5000, seed=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit=None, daily_credits=None,
+                 clock=time.time):
+        self.coins = coins
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.daily_credits = daily_credits
+        self.clock = clock
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.credits = {}
+        self.__random = Random(seed)
+        self.__minute = (None, 0)
+        self.__day = (None, 0)
+
+    def __noise(self, *key):
+        h = zlib.crc32(':'.join(str(k) for k in (self.seed, *key)).encode())
+        return h / 0x80000000 - 1.0
+
+    def __base_price(self, _id):
+        return exp(log(0.001) + (self.__noise(_id, 'price') + 1) / 2 * 17.7)
+
+    def price(self, _id, moment):
+        """
+        This function calculates the price of a cryptocurrency at a point in
+        time. The price drifts smoothly within each minute, hour, day and week.
+
+        :param _id: The market ID of the cryptocurrency.
+        :param moment: The point in time, in seconds since the epoch.
+        :return: The price in USD.
+        """
+        drift = 0.0
+        for period, scale in PRICE_WALK:
+            position = moment / period
+            step = int(position // 1)
+            start = self.__noise(_id, period, step)
+            end = self.__noise(_id, period, step + 1)
+            drift += scale * (start + (end - start) * (position - step))
+        return self.__base_price(_id) * exp(drift)
+
+    def __coin(self, _id):
+        return {'id': _id, 'name': f'Coin {_id}', 'symbol': f'C{_id}'}
+
+    def listing(self):
+        """
+        This function lists every cryptocurrency, in the shape of the map
+        endpoint's data.
+
+        :return: A list of cryptocurrencies.
+        """
+        return [
+            {**self.__coin(_id), 'slug': f'coin-{_id}', 'is_active': 1}
+            for _id in range(1, self.coins + 1)
+        ]
+
+    def metadata(self, _id):
+        """
+        This function describes a cryptocurrency, in the shape of one entry of
+        the info endpoint's data.
+
+        :param _id: The market ID of the cryptocurrency.
+        :return: The metadata for the cryptocurrency.
+        """
+        return {
+            **self.__coin(_id),
+            'logo': f'https://example.com/coins/{_id}.png',
+            'urls': {'website': [f'https://example.com/coins/{_id}']}
+        }
+
+    def quote(self, _id, moment):
+        """
+        This function quotes a cryptocurrency, in the shape of one entry of the
+        quotes/latest endpoint's data.
+
+        :param _id: The market ID of the cryptocurrency.
+        :param moment: The point in time, in seconds since the epoch.
+        :return: The quote for the cryptocurrency.
+        """
+        price = self.price(_id, moment)
+        supply = int(1e6 * (self.__noise(_id, 'supply') + 1.5) * 1000)
+        volume = price * supply * 0.05 * (1.5 + self.__noise(_id, moment // 60))
+        changes = {
+            f'percent_change_{name}':
+                (price / self.price(_id, moment - seconds) - 1) * 100
+            for name, seconds in PRICE_CHANGES.items()
+        }
+        updated = datetime.utcfromtimestamp(moment).isoformat() + 'Z'
+        return {
+            **self.__coin(_id),
+            'circulating_supply': supply,
+            'last_updated': updated,
+            'quote': {'USD': {
+                'price': price,
+                'volume_24h': volume,
+                'market_cap': price * supply,
+                **changes,
+                'last_updated': updated
+            }}
+        }
+
+    def __count(self, window, period, now):
+        current = int(now // period)
+        return current, (window[1] if window[0] == current else 0)
+
+    def admit(self, endpoint, credits):
+        """
+        This function decides how a request is answered, counting it against the
+        rate limit and charging its credits if it succeeds.
+
+        :param endpoint: The endpoint requested.
+        :param credits: The number of credits the request costs.
+        :return: None if the request succeeds, otherwise the status code, the
+        CoinMarketCap error code and message, and the seconds to wait before
+        retrying, if any.
+        """
+        now = self.clock()
+        self.requests += 1
+        minute, made = self.__count(self.__minute, 60, now)
+        day, spent = self.__count(self.__day, 86400, now)
+        self.__minute = (minute, made + 1)
+        if self.rate_limit is not None and made >= self.rate_limit:
+            self.rate_limited += 1
+            message = "You've exceeded your API Key's HTTP request rate limit."
+            return 429, 1008, message, ceil(60 - now % 60)
+        if self.daily_credits is not None and \
+                spent + credits > self.daily_credits:
+            self.rate_limited += 1
+            message = "You've exceeded your API Key's daily credit limit."
+            return 429, 1009, message, ceil(86400 - now % 86400)
+        if self.__random.random() < self.error_rate:
+            self.errors += 1
+            return 500, 500, 'An internal server error occurred.', None
+        self.__day = (day, spent + credits)
+        self.credits[endpoint] = self.credits.get(endpoint, 0) + credits
+        return None
+
+    def delay(self):
+        """
+        This function picks how long the next response is delayed.
+
+        :return: The delay, in seconds.
+        """
+        return self.latency + self.__random.uniform(0, self.jitter)
+
+    def usage(self):
+        """
+        This function reports the requests and credits used, in the shape of
+        the key/info endpoint's data.
+
+        :return: The plan limits and usage.
+        """
+        now = self.clock()
+        _, made = self.__count(self.__minute, 60, now)
+        _, spent = self.__count(self.__day, 86400, now)
+        return {
+            'plan': {
+                'credit_limit_daily': self.daily_credits,
+                'rate_limit_minute': self.rate_limit
+            },
+            'usage': {
+                'current_minute': {'requests_made': made},
+                'current_day': {'credits_used': spent},
+                'total': {
+                    'requests_made': self.requests,
+                    'credits_used': sum(self.credits.values()),
+                    'credits_by_endpoint': dict(self.credits),
+                    'errors': self.errors,
+                    'rate_limited': self.rate_limited
+                }
+            }
+        }
+
+
+def __status(code=0, message=None, credits=0):
+    return {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'error_code': code,
+        'error_message': message,
+        'credit_count': credits
+    }
+
+
+def __requested_ids(request, api):
+    try:
+        ids = [int(_id) for _id in request.query.get('id', '').split(',')]
+    except ValueError:
+        return None
+    if not all(1 <= _id <= api.coins for _id in ids):
+        return None
+    return list(dict.fromkeys(ids))
+
+
+def make_app(api):
+    """
+    This function builds the web app serving a FakeCoinApi.
+
+    :param api: The FakeCoinApi to serve.
+    :return: The aiohttp application.
+    """
+    def endpoint(name, cost, build):
+        async def handle(request):
+            await asyncio.sleep(api.delay())
+            ids = None if name == 'map' else __requested_ids(request, api)
+            if name != 'map' and ids is None:
+                body = {'status': __status(400, 'Invalid value for "id".')}
+                return web.json_response(body, status=400)
+            credits = cost(ids)
+            refusal = api.admit(name, credits)
+            if refusal:
+                status, code, message, retry_after = refusal
+                headers = {}
+                if retry_after is not None:
+                    headers['Retry-After'] = str(retry_after)
+                body = {'status': __status(code, message)}
+                return web.json_response(body, status=status, headers=headers)
+            body = {'status': __status(credits=credits), 'data': build(ids)}
+            return web.json_response(body)
+        return handle
+
+    app = web.Application()
+    app.router.add_get('/v1/cryptocurrency/map', endpoint(
+        'map', lambda _: ceil(api.coins / 5000), lambda _: api.listing()
+    ))
+    app.router.add_get('/v1/cryptocurrency/info', endpoint(
+        'info', lambda ids: credits_for(len(ids)),
+        lambda ids: {str(_id): api.metadata(_id) for _id in ids}
+    ))
+    app.router.add_get('/v1/cryptocurrency/quotes/latest', endpoint(
+        'quotes/latest', lambda ids: credits_for(len(ids)),
+        lambda ids: {str(_id): api.quote(_id, api.clock()) for _id in ids}
+    ))
+
+    async def key_info(request):
+        return web.json_response({'status': __status(), 'data': api.usage()})
+
+    app.router.add_get('/v1/key/info', key_info)
+    return app
+
+
+async def start(api, host='localhost', port=8800):
+    """
+    This function starts serving a FakeCoinApi in the running event loop.
+
+    :param api: The FakeCoinApi to serve.
+    :param host: The host to listen on.
+    :param port: The port to listen on.
+    :return: The runner, to be cleaned up when done, and the base URL.
+    """
+    runner = web.AppRunner(make_app(api))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner, f'http://{host}:{port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--coins', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int)
+    parser.add_argument('--daily-credits', type=int)
+    args = parser.parse_args()
+    api = FakeCoinApi(
+        coins=args.coins, seed=args.seed, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit=args.rate_limit, daily_credits=args.daily_credits
+    )
+    web.run_app(make_app(api), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#! python3
+
+# PSL Imports
+from functools import wraps
+from random import Random
+import asyncio
+import threading
+import time
+
+# Internal Imports
+import src.settings as settings
+
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Summary:
+    """
+    Summary tracks the count and sum of a series of observations, along with a
+    fixed-size uniform sample of them (a reservoir) from which quantiles are
+    estimated, so memory use stays flat however many values are observed.
+
+    :param size: The number of observations kept in the reservoir.
+    :param seed: The seed for choosing which observations are kept.
+    """
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self.samples = []
+        self.__random = Random(seed)
+
+    def observe(self, value):
+        """
+        This function records an observation.
+
+        :param value: The observed value.
+        :return: None
+        """
+        self.count += 1
+        self.total += value
+        if len(self.samples) < self.size:
+            self.samples.append(value)
+            return
+        i = self.__random.randrange(self.count)
+        if i < self.size:
+            self.samples[i] = value
+
+    def quantile(self, q):
+        """
+        This function estimates a quantile of the observations.
+
+        :param q: The quantile, between 0 and 1.
+        :return: The estimated value, or None if nothing has been observed.
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Registry:
+    """
+    Registry holds the counters, gauges and summaries a process records, and
+    renders them in the Prometheus text exposition format. It is safe to record
+    to from the database worker threads as well as the event loop.
+
+    :param reservoir_size: The number of observations each summary keeps for
+    estimating quantiles.
+    """
+
+    def __init__(self, reservoir_size=None):
+        self.reservoir_size = reservoir_size or \
+            settings.get('metrics_reservoir_size')
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def __series(self, name, kind):
+        metric = self.__metrics.setdefault(name, {'kind': kind, 'series': {}})
+        return metric['series']
+
+    def increment(self, name, amount=1, **labels):
+        """
+        This function adds to a counter.
+
+        :param name: The name of the counter.
+        :param amount: The amount to add.
+        :return: None
+        """
+        key = tuple(labels.items())
+        with self.__lock:
+            series = self.__series(name, 'counter')
+            series[key] = series.get(key, 0) + amount
+
+    def set(self, name, value, kind='gauge', **labels):
+        """
+        This function sets a gauge, or a counter kept somewhere else.
+
+        :param name: The name of the metric.
+        :param value: The current value.
+        :param kind: The type of metric - gauge or counter.
+        :return: None
+        """
+        with self.__lock:
+            self.__series(name, kind)[tuple(labels.items())] = value
+
+    def observe(self, name, value, **labels):
+        """
+        This function records an observation in a summary.
+
+        :param name: The name of the summary.
+        :param value: The observed value.
+        :return: None
+        """
+        key = tuple(labels.items())
+        with self.__lock:
+            series = self.__series(name, 'summary')
+            if key not in series:
+                series[key] = Summary(self.reservoir_size)
+            series[key].observe(value)
+
+    def set_summary(self, name, samples, count, total, **labels):
+        """
+        This function sets a summary recorded somewhere else.
+
+        :param name: The name of the summary.
+        :param samples: The sample of observations to estimate quantiles from.
+        :param count: The number of observations.
+        :param total: The sum of the observations.
+        :return: None
+        """
+        summary = Summary(len(samples))
+        summary.samples = list(samples)
+        summary.count = count
+        summary.total = total
+        with self.__lock:
+            self.__series(name, 'summary')[tuple(labels.items())] = summary
+
+    def span(self, kind):
+        """
+        This function makes a decorator that times every call of a function or
+        coroutine function, recording the durations in the span_seconds summary
+        and counting the calls that raise in span_errors_total.
+
+        :param kind: The kind of work the function does, such as database.
+        :return: The decorator.
+        """
+        def decorate(function):
+            labels = {'kind': kind, 'function': function.__name__}
+
+            def finish(started, failed):
+                self.observe('coinroll_span_seconds',
+                             time.perf_counter() - started, **labels)
+                if failed:
+                    self.increment('coinroll_span_errors_total', **labels)
+
+            if asyncio.iscoroutinefunction(function):
+                @wraps(function)
+                async def timed(*args, **kwargs):
+                    started = time.perf_counter()
+                    failed = True
+                    try:
+                        result = await function(*args, **kwargs)
+                        failed = False
+                        return result
+                    finally:
+                        finish(started, failed)
+            else:
+                @wraps(function)
+                def timed(*args, **kwargs):
+                    started = time.perf_counter()
+                    failed = True
+                    try:
+                        result = function(*args, **kwargs)
+                        failed = False
+                        return result
+                    finally:
+                        finish(started, failed)
+            return timed
+        return decorate
+
+    def __format_labels(self, labels):
+        if not labels:
+            return ''
+        escaped = (
+            str(v).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n')
+            for v in labels.values()
+        )
+        pairs = ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped))
+        return '{' + pairs + '}'
+
+    def __format_value(self, value):
+        return 'NaN' if value is None else repr(float(value))
+
+    def render(self):
+        """
+        This function renders every metric in the Prometheus text format.
+
+        :return: The rendered metrics.
+        """
+        lines = []
+        with self.__lock:
+            for name, metric in sorted(self.__metrics.items()):
+                lines.append(f'# TYPE {name} {metric["kind"]}')
+                for key, value in metric['series'].items():
+                    labels = dict(key)
+                    if metric['kind'] != 'summary':
+                        lines.append(f'{name}{self.__format_labels(labels)} '
+                                     f'{self.__format_value(value)}')
+                        continue
+                    for q in QUANTILES:
+                        quantile = {**labels, 'quantile': str(q)}
+                        lines.append(
+                            f'{name}{self.__format_labels(quantile)} '
+                            f'{self.__format_value(value.quantile(q))}'
+                        )
+                    lines.append(f'{name}_sum{self.__format_labels(labels)} '
+                                 f'{self.__format_value(value.total)}')
+                    lines.append(f'{name}_count{self.__format_labels(labels)} '
+                                 f'{value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+span = registry.span
+
+
+class TimingMiddleware:
+    """
+    TimingMiddleware records how long every HTTP request takes, until the last
+    of its response has been sent, in the http_request_seconds summary, and
+    counts the responses by status in http_requests_total. Both are labelled
+    with the route's path template rather than the requested path, so that
+    requests for different coins are counted together. Server-sent event
+    streams stay open for as long as the client is connected, so how long they
+    were open is recorded in http_stream_seconds instead, where it doesn't
+    swamp the request latencies.
+
+    :param app: The ASGI application being timed.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __route_template(self, scope):
+        endpoint = scope.get('endpoint')
+        if endpoint is not None:
+            for route in getattr(scope.get('app'), 'routes', ()):
+                if getattr(route, 'endpoint', None) is endpoint:
+                    return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        response = {'status': 500, 'stream': False}
+
+        async def timed_send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                headers = dict(message.get('headers', ()))
+                response['stream'] = headers.get(b'content-type', b'') \
+                    .startswith(b'text/event-stream')
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            labels = {
+                'method': scope['method'],
+                'route': self.__route_template(scope)
+            }
+            seconds = time.perf_counter() - started
+            if response['stream']:
+                registry.observe('coinroll_http_stream_seconds', seconds,
+                                 **labels)
+            else:
+                registry.observe('coinroll_http_request_seconds', seconds,
+                                 **labels)
+            registry.increment('coinroll_http_requests_total',
+                               status=str(response['status']), **labels)
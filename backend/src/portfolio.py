@@ -1,35 +1,141 @@
 #! python3
 
 # PSL Imports
-from itertools import groupby
+from collections import Counter, deque
 
 
-def __get_coin_count(records):
-    owned = 0
+def __consume_lots(position, quantity, price):
+    profit = 0
+    lots = position['lots']
+    while quantity and lots:
+        lot_quantity, lot_price = lots[0]
+        taken = min(quantity, lot_quantity)
+        gain = taken * (price - lot_price)
+        position['total_coin_profit'] += gain
+        profit += gain
+        quantity -= taken
+        if taken == lot_quantity:
+            lots.popleft()
+        else:
+            lots[0] = (lot_quantity - taken, lot_price)
+    return profit
+
+
+def new_position():
+    """
+    This function creates an empty position for a cryptocurrency, ready to have
+    transaction records applied to it.
+
+    :return: A position holding no lots and no realized profit.
+    """
+    return {
+        'lots': deque(),
+        'current_coins': 0,
+        'usd_invested': 0,
+        'total_coin_profit': 0
+    }
+
+
+def apply_transaction(position, record):
+    """
+    This function applies a single transaction record to a position. Purchases
+    open a new lot at the end of the queue, and sells consume the oldest lots
+    first, splitting a lot when the sale only uses part of it.
+
+    :param position: The position for the record's cryptocurrency.
+    :param record: The transaction record to apply.
+    :return: The profit realized by the record (always 0 for a purchase).
+    """
+    quantity = record['quantity']
+    price = record['price_in_usd']
+    if record['type'] == 'purchase':
+        position['lots'].append((quantity, price))
+        position['current_coins'] += quantity
+        position['usd_invested'] += quantity * price
+        return 0
+    if record['type'] == 'sell':
+        position['current_coins'] -= quantity
+        return __consume_lots(position, quantity, price)
+    return 0
+
+
+def get_position(records):
+    """
+    This function builds the FIFO position for a cryptocurrency by applying its
+    transaction records in order. Its cost grows with the number of records, not
+    with the number of units they trade.
+
+    :param records: The user's history of transaction records for a given
+    cryptocurrency, ordered by transaction time.
+    :return: The position for the cryptocurrency.
+    """
+    position = new_position()
     for record in records:
-        if record['type'] == 'purchase':
-            owned += record['quantity']
-        elif record['type'] == 'sell':
-            owned -= record['quantity']
-    return owned
+        apply_transaction(position, record)
+    return position
 
 
-def __make_queue(records):
-    queue = []
+def replay(records):
+    """
+    This function replays a complete transaction history, building the position
+    for every cryptocurrency in it along with the profit each record realized
+    and the quantity held after it, from which daily rollups are built.
+
+    :param records: The user's complete history of transaction records, ordered
+    by transaction time.
+    :return: The positions keyed by CoinMarketCap API market ID, and a list of
+    the realized profit and closing coins for each record, in order.
+    """
+    positions = {}
+    outcomes = []
     for record in records:
-        for _ in range(record['quantity']):
-            queue.append(record['price_in_usd'])
-    return queue
+        position = positions.get(record['market_id'])
+        if position is None:
+            position = positions[record['market_id']] = new_position()
+        profit = apply_transaction(position, record)
+        outcomes.append((profit, position['current_coins']))
+    return positions, outcomes
 
 
-def __get_total_coin_profit(records):
-    g = {t: __make_queue(v) for t, v in groupby(records, lambda r: r['type'])}
-    profit = 0
-    if not g.get('sell'):
-        return profit
-    for sale in g['sell']:
-        profit += sale - g['purchase'].pop(0)
-    return profit
+def summarize_position(position, quote):
+    """
+    This function formats a position and the current price information for its
+    cryptocurrency into a summary for that cryptocurrency.
+
+    :param position: The position for the cryptocurrency.
+    :param quote: The current financial information for the cryptocurrency.
+    :return: The portfolio summary for the given cryptocurrency.
+    """
+    return {
+        'current_coins': position['current_coins'],
+        'usd_invested': position['usd_invested'],
+        'current_usd_value': quote['price'] * position['current_coins'],
+        'total_coin_profit': position['total_coin_profit']
+    }
+
+
+def __summary_keys(names):
+    counts = Counter(names.values())
+    return {
+        _id: name if counts[name] == 1 else f'{name} ({_id})'
+        for _id, name in names.items()
+    }
+
+
+def __total_summaries(summaries):
+    total_usd_invested = 0
+    total_current_usd_value = 0
+    total_profit = 0
+    for summary in summaries.values():
+        total_usd_invested += summary['usd_invested']
+        total_current_usd_value += summary['current_usd_value']
+        total_profit += summary['total_coin_profit']
+    return {
+        'total_usd_invested': total_usd_invested,
+        'total_current_usd_value': total_current_usd_value,
+        'total_profit': total_profit,
+        'coin_summaries': summaries
+    }
 
 
 def get_coin_summary(records, quote):
@@ -43,44 +149,141 @@ def get_coin_summary(records, quote):
     :param quote: The current financial information for the cryptocurrency.
     :return: The portfolio summary for the given cryptocurrency.
     """
-    spent = [r['quantity'] * r['price_in_usd'] 
-             for r in records if r['type'] == 'purchase']
-    current_coins = __get_coin_count(records)
-    return {
-        'current_coins': current_coins,
-        'usd_invested': sum(spent),
-        'current_usd_value': quote['price'] * current_coins,
-        'total_coin_profit': __get_total_coin_profit(records)
-    }
+    return summarize_position(get_position(records), quote)
 
 
 def get_summary(records, quotes):
     """
     This function formats a provided transaction history and provided price
     information for all cryptocurrencies in the transaction history into a
-    complete portfolio summary.
+    complete portfolio summary. Records are partitioned by market ID in a single
+    pass, and only the cryptocurrencies that have a quote are summarized.
 
     :param records: The user's complete history of transaction records.
     :param quotes: The current financial information for each cryptocurrency the
     user currently owns.
     :return: The complete portfolio summary.
     """
-    coin_groups = {coin: [r for r in records if r['name'] == coin] 
-                   for coin, _ in groupby(records, lambda r: r['name'])}
-    summaries = {q['name']: get_coin_summary(coin_groups[q['name']], q) 
+    positions = {q['id']: new_position() for q in quotes}
+    for record in records:
+        position = positions.get(record['market_id'])
+        if position is not None:
+            apply_transaction(position, record)
+    return summarize_positions(positions, quotes)
+
+
+def summarize_positions(positions, quotes):
+    """
+    This function formats stored positions and provided price information for
+    each cryptocurrency into a complete portfolio summary, without replaying any
+    transaction records.
+
+    :param positions: The user's positions, keyed by CoinMarketCap API market
+    ID.
+    :param quotes: The current financial information for each cryptocurrency the
+    user currently owns.
+    :return: The complete portfolio summary, with each cryptocurrency's summary
+    keyed by its name, followed by its market ID if another cryptocurrency in
+    the summary has the same name.
+    """
+    keys = __summary_keys({q['id']: q['name'] for q in quotes})
+    summaries = {keys[q['id']]: summarize_position(positions[q['id']], q)
                  for q in quotes}
+    return __total_summaries(summaries)
+
+
+def get_unpriced_ids(positions, quotes):
+    """
+    This function finds the positions that a portfolio summary can't include
+    because no price information was retrieved for their cryptocurrency.
+
+    :param positions: The user's positions, keyed by CoinMarketCap API market
+    ID.
+    :param quotes: The price information that was retrieved.
+    :return: A list of the market IDs of the positions left out.
+    """
+    priced = {q['id'] for q in quotes}
+    return [_id for _id in positions if _id not in priced]
+
+
+def add_to_rollup(rollups, record, profit, closing_coins):
+    """
+    This function adds a transaction record to the daily rollup for its
+    cryptocurrency and day, creating the rollup if it doesn't exist yet.
+
+    :param rollups: The daily rollups, keyed by CoinMarketCap API market ID and
+    day.
+    :param record: The transaction record to add.
+    :param profit: The profit the record realized, as returned by
+    apply_transaction.
+    :param closing_coins: The quantity of the cryptocurrency held after the
+    record.
+    :return: The updated rollup.
+    """
+    day = record['transaction_time'].replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    rollup = rollups.setdefault((record['market_id'], day), {
+        'market_id': record['market_id'],
+        'name': record['name'],
+        'day': day,
+        'units_bought': 0,
+        'units_sold': 0,
+        'usd_invested': 0,
+        'usd_received': 0,
+        'total_coin_profit': 0,
+        'closing_coins': 0
+    })
+    value = record['quantity'] * record['price_in_usd']
+    if record['type'] == 'purchase':
+        rollup['units_bought'] += record['quantity']
+        rollup['usd_invested'] += value
+    elif record['type'] == 'sell':
+        rollup['units_sold'] += record['quantity']
+        rollup['usd_received'] += value
+    rollup['total_coin_profit'] += profit
+    rollup['closing_coins'] = closing_coins
+    return rollup
+
+
+def summarize_rollups(rollups):
+    """
+    This function formats the daily rollups for a range of days into a summary
+    of the trading done in that range.
+
+    :param rollups: The daily rollups for the range, ordered by day.
+    :return: The portfolio summary for the range, with each cryptocurrency's
+    summary keyed as in summarize_positions.
+    """
+    names = {}
+    summaries = {}
+    for rollup in rollups:
+        names[rollup['market_id']] = rollup['name']
+        summary = summaries.setdefault(rollup['market_id'], {
+            'units_bought': 0,
+            'units_sold': 0,
+            'usd_invested': 0,
+            'usd_received': 0,
+            'total_coin_profit': 0,
+            'closing_coins': 0
+        })
+        for key in summary:
+            if key != 'closing_coins':
+                summary[key] += rollup[key]
+        summary['closing_coins'] = rollup['closing_coins']
     total_usd_invested = 0
-    total_current_usd_value = 0
+    total_usd_received = 0
     total_profit = 0
     for summary in summaries.values():
         total_usd_invested += summary['usd_invested']
-        total_current_usd_value += summary['current_usd_value']
+        total_usd_received += summary['usd_received']
         total_profit += summary['total_coin_profit']
+    keys = __summary_keys(names)
     return {
         'total_usd_invested': total_usd_invested,
-        'total_current_usd_value': total_current_usd_value,
+        'total_usd_received': total_usd_received,
         'total_profit': total_profit,
-        'coin_summaries': summaries
+        'coin_summaries': {keys[_id]: s for _id, s in summaries.items()}
     }
 
 
@@ -95,4 +298,4 @@ def has_sufficient_coins(records, selling):
     :return: The boolean value for whether the user has sufficient stock of the
     cryptocurrency in order to make the sale.
     """
-    return __get_coin_count(records) >= selling
+    return get_position(records)['current_coins'] >= selling
@@ -0,0 +1,205 @@
+#! python3
+
+# PSL Imports
+from collections import deque
+
+# 3p Imports
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Internal Imports
+import src.portfolio as portfolio
+
+
+def __require_numpy():
+    if np is None:
+        raise ImportError('The vectorized portfolio engine requires NumPy.')
+
+
+def __accumulate(values):
+    # np.add.accumulate sums in order, matching the running totals kept by
+    # the portfolio module exactly, where np.sum would not.
+    return float(np.add.accumulate(values)[-1]) if len(values) else 0
+
+
+def load_records(records):
+    """
+    This function loads transaction records into columnar NumPy arrays, sorted
+    by market ID while keeping each cryptocurrency's records in their original
+    order.
+
+    :param records: The user's history of transaction records, ordered by
+    transaction time.
+    :return: A dictionary of arrays for the market_id, purchase, price and
+    quantity columns, and an index column holding each record's position in
+    the given records.
+    """
+    __require_numpy()
+    columns = {
+        'market_id': np.array([r['market_id'] for r in records], dtype=np.int64),
+        'purchase': np.array([r['type'] == 'purchase' for r in records],
+                             dtype=bool),
+        'price': np.array([r['price_in_usd'] for r in records],
+                          dtype=np.float64),
+        'quantity': np.array([r['quantity'] for r in records], dtype=np.int64),
+        'index': np.arange(len(records))
+    }
+    order = np.argsort(columns['market_id'], kind='stable')
+    return {name: column[order] for name, column in columns.items()}
+
+
+def __match_sales(cum_bought, buy_prices, sold, sell_prices):
+    cum_sold = np.cumsum(sold)
+    ends = np.union1d(cum_bought[cum_bought < cum_sold[-1]], cum_sold)
+    ends = ends[ends > 0]
+    starts = np.concatenate(([0], ends[:-1]))
+    lots = np.searchsorted(cum_bought, starts, side='right')
+    sales = np.searchsorted(cum_sold, starts, side='right')
+    gains = (ends - starts) * (sell_prices[sales] - buy_prices[lots])
+    return gains, sales
+
+
+def __replay_coin(quantity, price, purchase):
+    # The coins left in lots never go below zero: a sell for more than is held
+    # empties the lots and realizes no profit on the rest, as in the portfolio
+    # module, while current_coins goes negative. Holding is the running total
+    # with every dip below zero clipped off.
+    walk = np.cumsum(np.where(purchase, quantity, -quantity))
+    held = walk - np.minimum(np.minimum.accumulate(walk), 0)
+    sold = -np.diff(held, prepend=0)[~purchase]
+    bought = quantity[purchase]
+    buy_prices = price[purchase]
+    cum_bought = np.cumsum(bought)
+    consumed = int(sold.sum())
+    profits = np.zeros(len(quantity))
+    position = {
+        'lots': deque(),
+        'current_coins': int(walk[-1]),
+        'usd_invested': __accumulate(bought * buy_prices),
+        'total_coin_profit': 0
+    }
+    if consumed:
+        gains, sales = __match_sales(
+            cum_bought, buy_prices, sold, price[~purchase]
+        )
+        position['total_coin_profit'] = __accumulate(gains)
+        profits[~purchase] = np.bincount(sales, weights=gains,
+                                         minlength=len(sold))
+    remaining = np.clip(cum_bought - consumed, 0, bought)
+    kept = remaining > 0
+    position['lots'].extend(
+        zip(remaining[kept].tolist(), buy_prices[kept].tolist())
+    )
+    return position, walk, profits
+
+
+def __coin_ranges(columns):
+    market_ids, starts = np.unique(columns['market_id'], return_index=True)
+    ends = np.append(starts[1:], len(columns['market_id']))
+    return zip(market_ids.tolist(), starts, ends)
+
+
+def get_positions(columns, ids=None):
+    """
+    This function computes the lots, holdings, USD invested and FIFO realized
+    profit for every cryptocurrency in a set of columnar records. Each
+    cryptocurrency's sells are matched against its purchases by splitting both
+    into the segments where their cumulative quantities overlap, so no units
+    are expanded. A sell for more than is held at the time is handled as the
+    portfolio module handles it.
+
+    :param columns: The columnar records, as returned by load_records.
+    :param ids: An optional collection of market IDs to limit the computation
+    to.
+    :return: A dictionary of positions keyed by CoinMarketCap API market ID.
+    """
+    __require_numpy()
+    positions = {}
+    for _id, start, end in __coin_ranges(columns):
+        if ids is not None and _id not in ids:
+            continue
+        positions[_id], _, _ = __replay_coin(
+            columns['quantity'][start:end],
+            columns['price'][start:end],
+            columns['purchase'][start:end]
+        )
+    return positions
+
+
+def replay(records):
+    """
+    This function is the vectorized equivalent of portfolio.replay, and returns
+    identical positions and outcomes.
+
+    :param records: The user's complete history of transaction records, ordered
+    by transaction time.
+    :return: The positions keyed by CoinMarketCap API market ID, and a list of
+    the realized profit and closing coins for each record, in order.
+    """
+    columns = load_records(records)
+    positions = {}
+    profits = np.zeros(len(records))
+    closing = np.zeros(len(records), dtype=np.int64)
+    for _id, start, end in __coin_ranges(columns):
+        positions[_id], walk, coin_profits = __replay_coin(
+            columns['quantity'][start:end],
+            columns['price'][start:end],
+            columns['purchase'][start:end]
+        )
+        index = columns['index'][start:end]
+        profits[index] = coin_profits
+        closing[index] = walk
+    return positions, list(zip(profits.tolist(), closing.tolist()))
+
+
+def get_coin_summary(records, quote):
+    """
+    This function is the vectorized equivalent of portfolio.get_coin_summary,
+    and returns an identical summary.
+
+    :param records: The user's history of transaction records for a given
+    cryptocurrency.
+    :param quote: The current financial information for the cryptocurrency.
+    :return: The portfolio summary for the given cryptocurrency.
+    """
+    positions = get_positions(load_records(records))
+    position = next(iter(positions.values()), None) or \
+        portfolio.new_position()
+    return portfolio.summarize_position(position, quote)
+
+
+def get_summary(records, quotes):
+    """
+    This function is the vectorized equivalent of portfolio.get_summary, and
+    returns an identical summary.
+
+    :param records: The user's complete history of transaction records.
+    :param quotes: The current financial information for each cryptocurrency the
+    user currently owns.
+    :return: The complete portfolio summary.
+    """
+    ids = {q['id'] for q in quotes}
+    positions = get_positions(load_records(records), ids)
+    positions = {
+        _id: positions.get(_id) or portfolio.new_position() for _id in ids
+    }
+    return portfolio.summarize_positions(positions, quotes)
+
+
+def has_sufficient_coins(records, selling):
+    """
+    This function is the vectorized equivalent of
+    portfolio.has_sufficient_coins.
+
+    :param records: The transaction records for the cryptocurrency the user
+    wishes to sell.
+    :param selling: The quantity of said cryptocurrency the user wishes to sell.
+    :return: The boolean value for whether the user has sufficient stock of the
+    cryptocurrency in order to make the sale.
+    """
+    __require_numpy()
+    quantity = np.array([r['quantity'] for r in records], dtype=np.int64)
+    purchase = np.array([r['type'] == 'purchase' for r in records], dtype=bool)
+    return int(quantity[purchase].sum() - quantity[~purchase].sum()) >= selling
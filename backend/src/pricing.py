@@ -0,0 +1,72 @@
+#! python3
+
+# PSL Imports
+from datetime import datetime
+import asyncio
+import time
+
+# Internal Imports
+import src.coin_api as coin_api
+import src.database as db
+import src.scheduler as scheduler
+import src.settings as settings
+
+
+async def get_quotes(ids):
+    """
+    This function retrieves current price information for a list of
+    cryptocurrencies. Prices already stored by the watchlist refresh are used
+    while they are recent enough, and only the remaining cryptocurrencies are
+    requested from the CoinMarketCap API. Quotes without a price, which the API
+    sends for some new or illiquid coins, are treated as unavailable.
+
+    :param ids: A list of IDs (each corresponding to the ID from the
+    MarketCoinCap API used for this project).
+    :return: The price information for the requested cryptocurrencies.
+    """
+    ids = [str(_id) for _id in ids]
+    quotes = {}
+    max_age = settings.get('watch_price_max_age')
+    if max_age and ids:
+        for quote in await db.get_watched_quotes(ids, max_age):
+            if quote['price'] is not None:
+                quotes[str(quote['id'])] = quote
+    missing = [_id for _id in ids if _id not in quotes]
+    if missing:
+        for quote in await coin_api.get_coin_quotes(missing):
+            if quote['price'] is not None:
+                quotes[str(quote['id'])] = quote
+    return [quotes[_id] for _id in ids if _id in quotes]
+
+
+async def refresh_watchlist():
+    """
+    This function fetches current prices for the cryptocurrencies on the
+    watchlist that the scheduler says are due a refresh, then stores them on the
+    watchlist and in the price history.
+
+    :return: The number of Watches written and left unchanged, the batches
+    that could not be fetched, the refresh plan, and the time the refresh took
+    in seconds.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    watches, usage = await asyncio.gather(
+        db.get_refresh_candidates(),
+        db.get_credit_usage(now)
+    )
+    plan = scheduler.plan_refresh(watches, usage, now)
+    result = {'written': 0, 'unchanged': 0, 'failures': [], 'plan': plan}
+    if not plan['ids']:
+        result['seconds'] = time.perf_counter() - started
+        return result
+    ids = [str(_id) for _id in plan['ids']]
+    quotes, failures = await coin_api.fetch_coin_quotes(ids)
+    written, _ = await asyncio.gather(
+        db.update_watchlist(quotes),
+        db.record_price_history(quotes)
+    )
+    result.update(written)
+    result['failures'] = failures
+    result['seconds'] = time.perf_counter() - started
+    return result
@@ -0,0 +1,134 @@
+#! python3
+
+# PSL Imports
+from collections import OrderedDict
+import asyncio
+import time
+
+
+class QuoteCache:
+    """
+    QuoteCache holds recently fetched cryptocurrency quotes in memory, keyed by
+    CoinMarketCap API market ID. Entries expire after a fixed time to live, and
+    the least recently used entries are evicted once the cache is full. Callers
+    asking for an ID that is already being fetched wait on that fetch instead of
+    starting another one.
+
+    :param ttl: The number of seconds a quote is served from the cache.
+    :param max_size: The maximum number of quotes held in the cache.
+    :param clock: The function used to read the current time, in seconds.
+    """
+
+    def __init__(self, ttl, max_size, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.__entries = OrderedDict()
+        self.__pending = {}
+
+    def __store(self, _id, quote):
+        self.__entries[_id] = (self.clock(), quote)
+        self.__entries.move_to_end(_id)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    def __lookup(self, _id):
+        entry = self.__entries.get(_id)
+        if not entry or self.clock() - entry[0] >= self.ttl:
+            return None
+        self.__entries.move_to_end(_id)
+        return entry[1]
+
+    async def __fetch(self, ids, fetch):
+        try:
+            quotes = await fetch(ids)
+            found = {str(quote['id']): quote for quote in quotes}
+            for _id, quote in found.items():
+                self.__store(_id, quote)
+            return found
+        finally:
+            for _id in ids:
+                self.__pending.pop(_id, None)
+
+    async def get_many(self, ids, fetch):
+        """
+        This function retrieves quotes for a list of IDs, serving fresh ones
+        from the cache and fetching the rest with a single call.
+
+        :param self: The QuoteCache object.
+        :param ids: A list of CoinMarketCap API market IDs.
+        :param fetch: A coroutine function that retrieves the quotes for a list
+        of IDs.
+        :return: The quotes for the requested IDs, in the order requested.
+        """
+        found = {}
+        waiting = {}
+        missing = []
+        ids = list(dict.fromkeys(str(_id) for _id in ids))
+        for _id in ids:
+            quote = self.__lookup(_id)
+            if quote:
+                self.hits += 1
+                found[_id] = quote
+            elif _id in self.__pending:
+                self.coalesced += 1
+                waiting[_id] = self.__pending[_id]
+            else:
+                self.misses += 1
+                missing.append(_id)
+        if missing:
+            task = asyncio.ensure_future(self.__fetch(missing, fetch))
+            for _id in missing:
+                self.__pending[_id] = task
+            waiting.update((_id, task) for _id in missing)
+        for _id, task in waiting.items():
+            quote = (await asyncio.shield(task)).get(_id)
+            if quote:
+                found[_id] = quote
+        return [found[_id] for _id in ids if _id in found]
+
+    def get_stale(self, ids):
+        """
+        This function retrieves the last quotes fetched for a list of IDs,
+        however old they are, for when they can't be fetched again.
+
+        :param self: The QuoteCache object.
+        :param ids: A list of CoinMarketCap API market IDs.
+        :return: The quotes held for the requested IDs, in the order requested.
+        """
+        stale = []
+        for _id in dict.fromkeys(str(_id) for _id in ids):
+            entry = self.__entries.get(_id)
+            if entry:
+                self.stale += 1
+                stale.append(entry[1])
+        return stale
+
+    def clear(self):
+        """
+        This function empties the cache.
+
+        :param self: The QuoteCache object.
+        :return: None
+        """
+        self.__entries.clear()
+
+    def stats(self):
+        """
+        This function reports how effective the cache has been.
+
+        :param self: The QuoteCache object.
+        :return: The hit, miss, coalesce and stale counts, and the current
+        size.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'stale': self.stale,
+            'size': len(self.__entries)
+        }
@@ -0,0 +1,223 @@
+#! python3
+
+# PSL Imports
+from random import Random
+import asyncio
+import time
+
+
+class UpstreamError(Exception):
+    """
+    UpstreamError is raised when an upstream service answers a request with an
+    error instead of the data asked for.
+
+    :param message: A description of the error.
+    :param status: The HTTP status code of the response, if there was one.
+    :param retry_after: The number of seconds the service asked callers to wait
+    before retrying, if it asked.
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """
+        This function determines whether the request might succeed if it is
+        made again: it was rate limited, or the service failed to answer it.
+
+        :param self: The UpstreamError object.
+        :return: A boolean indicating whether the request should be retried.
+        """
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+class CircuitOpenError(Exception):
+    """
+    CircuitOpenError is raised instead of making a request while the circuit
+    breaker for an unhealthy service is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    CircuitBreaker stops requests to an upstream service once several in a row
+    have failed, so that callers fail fast instead of waiting on a service that
+    is down. Once the reset timeout has passed, a single trial request is let
+    through: if it succeeds the breaker closes again, and if it fails the
+    breaker stays open for another reset timeout.
+
+    :param failure_threshold: The number of failures in a row that opens the
+    breaker.
+    :param reset_timeout: The number of seconds the breaker stays open before
+    a trial request is let through.
+    :param clock: The function used to read the current time, in seconds.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.__trial = False
+
+    @property
+    def state(self):
+        """
+        This function reports the state of the breaker.
+
+        :param self: The CircuitBreaker object.
+        :return: closed, open or half-open.
+        """
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        """
+        This function determines whether a request may be made.
+
+        :param self: The CircuitBreaker object.
+        :return: A boolean indicating whether the request may be made.
+        """
+        state = self.state
+        if state == 'half-open' and not self.__trial:
+            self.__trial = True
+            return True
+        return state == 'closed'
+
+    def record_success(self):
+        """
+        This function records a request the service answered, closing the
+        breaker.
+
+        :param self: The CircuitBreaker object.
+        :return: None
+        """
+        self.failures = 0
+        self.opened_at = None
+        self.__trial = False
+
+    def record_failure(self):
+        """
+        This function records a failed request, opening the breaker if enough
+        have failed in a row or the trial request failed.
+
+        :param self: The CircuitBreaker object.
+        :return: None
+        """
+        self.failures += 1
+        if self.__trial or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+            self.__trial = False
+
+    async def call(self, request):
+        """
+        This function makes a request through the breaker.
+
+        :param self: The CircuitBreaker object.
+        :param request: A coroutine function that makes the request.
+        :return: The result of the request.
+        """
+        if not self.allow():
+            raise CircuitOpenError('The circuit breaker is open.')
+        try:
+            result = await request()
+        except Exception as e:
+            if getattr(e, 'retryable', True):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        except BaseException:
+            self.__trial = False
+            raise
+        self.record_success()
+        return result
+
+
+def backoff(attempt, base, cap, rng=Random()):
+    """
+    This function picks how long to wait before retrying a request, at random
+    between nothing and an exponentially growing limit, so that callers that
+    failed together don't all retry together.
+
+    :param attempt: The number of attempts made so far, starting from 0.
+    :param base: The limit, in seconds, after the first attempt.
+    :param cap: The largest limit, in seconds.
+    :param rng: The random number generator used.
+    :return: The number of seconds to wait.
+    """
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def retry(request, attempts, deadline, base, cap, sleep=asyncio.sleep,
+                clock=time.monotonic, rng=Random()):
+    """
+    This function makes a request, retrying it with jittered exponential backoff
+    if it fails with an error that might not happen again. A Retry-After the
+    service sends is waited out in full. Every attempt, and the waits between
+    them, must fit within the deadline.
+
+    :param request: A coroutine function that makes the request.
+    :param attempts: The most attempts to make.
+    :param deadline: The number of seconds all of the attempts must finish in.
+    :param base: The backoff limit, in seconds, after the first attempt.
+    :param cap: The largest backoff limit, in seconds.
+    :param sleep: The coroutine function used to wait.
+    :param clock: The function used to read the current time, in seconds.
+    :param rng: The random number generator used for the backoff.
+    :return: The result of the first successful attempt.
+    """
+    expires = clock() + deadline
+    for attempt in range(attempts):
+        try:
+            return await asyncio.wait_for(request(), expires - clock())
+        except Exception as e:
+            if not getattr(e, 'retryable', True) or attempt + 1 == attempts:
+                raise
+            delay = backoff(attempt, base, cap, rng)
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            if clock() + delay >= expires:
+                raise
+            await sleep(delay)
+
+
+async def hedge(request, delay):
+    """
+    This function makes a request and, if it hasn't finished after a delay,
+    makes it a second time, returning whichever succeeds first. This caps the
+    time spent waiting on the occasional request that is much slower than the
+    rest, at the cost of making some requests twice.
+
+    :param request: A coroutine function that makes the request.
+    :param delay: The number of seconds to wait before making the second
+    request.
+    :return: The result of the first request to succeed.
+    """
+    first = asyncio.ensure_future(request())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            return first.result()
+        pending.add(asyncio.ensure_future(request()))
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if not task.exception():
+                    return task.result()
+            if not pending:
+                return task.result()
+    finally:
+        for task in pending:
+            task.cancel()
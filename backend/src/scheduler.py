@@ -0,0 +1,127 @@
+#! python3
+
+# PSL Imports
+from datetime import datetime, timedelta
+from math import ceil
+
+# Internal Imports
+import src.settings as settings
+
+
+def credits_for(count):
+    """
+    This function calculates how many CoinMarketCap API credits a price request
+    for a number of cryptocurrencies costs.
+
+    :param count: The number of cryptocurrencies in the request.
+    :return: The number of credits the request costs.
+    """
+    return ceil(count / 100)
+
+
+def __next_day(now):
+    return datetime(now.year, now.month, now.day) + timedelta(days=1)
+
+
+def __next_month(now):
+    if now.month == 12:
+        return datetime(now.year + 1, 1, 1)
+    return datetime(now.year, now.month + 1, 1)
+
+
+def get_budget(usage, now):
+    """
+    This function calculates how many credits the watchlist refresh may still
+    spend today and this month. Only the configured share of each budget is
+    given to the refresh, so that the rest is left for the app's own requests.
+
+    :param usage: The credits used so far today and this month.
+    :param now: The current time (UTC).
+    :return: The credits used, the credits the refresh has left, and the
+    seconds left until each budget resets, for both the day and the month.
+    """
+    share = settings.get('refresh_credit_share')
+    budgets = {
+        'day': (settings.get('credit_daily_budget'), __next_day(now)),
+        'month': (settings.get('credit_monthly_budget'), __next_month(now))
+    }
+    return {
+        period: {
+            'used': usage[period],
+            'remaining': max(0, budget * share - usage[period]),
+            'resets_in': (resets - now).total_seconds()
+        }
+        for period, (budget, resets) in budgets.items()
+    }
+
+
+def get_interval(count, budget):
+    """
+    This function calculates how often the watchlist can be refreshed without
+    running out of credits before either budget resets.
+
+    :param count: The number of cryptocurrencies on the watchlist.
+    :param budget: The budget, as returned by get_budget.
+    :return: The number of seconds between refreshes.
+    """
+    interval = settings.get('refresh_min_interval')
+    cost = credits_for(count)
+    if not cost:
+        return interval
+    for period in budget.values():
+        refreshes = period['remaining'] // cost
+        if refreshes < 1:
+            return max(interval, period['resets_in'])
+        interval = max(interval, period['resets_in'] / refreshes)
+    return interval
+
+
+def is_hot(watch, now):
+    """
+    This function determines whether a watched cryptocurrency should be
+    refreshed at the full rate, because its price is moving quickly or the user
+    has looked at it recently.
+
+    :param watch: The Watch's market_id, hour_change and last_viewed fields.
+    :param now: The current time (UTC).
+    :return: The boolean value for whether the cryptocurrency is hot.
+    """
+    change = abs(watch.get('hour_change') or 0)
+    if change >= settings.get('refresh_volatility_threshold'):
+        return True
+    viewed = watch.get('last_viewed')
+    window = timedelta(seconds=settings.get('refresh_viewed_window'))
+    return viewed is not None and now - viewed <= window
+
+
+def plan_refresh(watches, usage, now):
+    """
+    This function decides which watched cryptocurrencies are due a refresh.
+    Hot cryptocurrencies are due once the budgeted interval has passed since
+    their last update, and the rest only after several intervals.
+
+    :param watches: The market_id, hour_change, last_viewed and last_updated
+    fields of every Watch.
+    :param usage: The credits used so far today and this month.
+    :param now: The current time (UTC).
+    :return: The IDs due a refresh, the credits that will cost, the interval
+    and the budget.
+    """
+    budget = get_budget(usage, now)
+    interval = get_interval(len(watches), budget)
+    cold_interval = interval * settings.get('refresh_cold_multiplier')
+    due = []
+    for watch in watches:
+        wait = interval if is_hot(watch, now) else cold_interval
+        updated = watch.get('last_updated')
+        if updated is None or (now - updated).total_seconds() >= wait:
+            due.append(watch['market_id'])
+    cost = credits_for(len(due))
+    if any(period['remaining'] < cost for period in budget.values()):
+        due = []
+    return {
+        'ids': due,
+        'credits': credits_for(len(due)),
+        'interval': interval,
+        'budget': budget
+    }
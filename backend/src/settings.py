@@ -0,0 +1,57 @@
+#! python3
+
+# Internal Imports
+try:
+    import src.config as config
+except Exception as e:
+    print(e)
+    config = None
+
+
+__defaults = {
+    'api_base_url': 'https://pro-api.coinmarketcap.com',
+    'api_pool_size': 20,
+    'api_dns_cache_ttl': 300,
+    'api_keepalive_timeout': 60.0,
+    'api_connect_timeout': 5.0,
+    'api_timeout': 15.0,
+    'api_batch_size': 100,
+    'api_max_concurrency': 4,
+    'api_deadline': 10.0,
+    'api_retries': 2,
+    'api_backoff_base': 0.5,
+    'api_backoff_cap': 8.0,
+    'api_hedge_delay': None,
+    'breaker_failure_threshold': 5,
+    'breaker_reset_timeout': 30.0,
+    'db_max_workers': 16,
+    'portfolio_engine': 'scalar',
+    'coin_list_chunk_size': 1000,
+    'history_raw_days': 2,
+    'history_minute_days': 7,
+    'history_hour_days': 90,
+    'history_day_days': 1825,
+    'credit_daily_budget': 333,
+    'credit_monthly_budget': 10000,
+    'refresh_credit_share': 0.8,
+    'refresh_min_interval': 30.0,
+    'refresh_cold_multiplier': 4,
+    'refresh_volatility_threshold': 1.0,
+    'refresh_viewed_window': 900,
+    'stream_poll_interval': 5.0,
+    'quote_cache_ttl': 10.0,
+    'quote_cache_size': 5000,
+    'watch_price_max_age': 60.0,
+    'metrics_reservoir_size': 1024,
+}
+
+
+def get(name):
+    """
+    This function retrieves an optional setting from the config file, falling
+    back to the app's default when the config file doesn't define it.
+
+    :param name: The name of the setting.
+    :return: The value of the setting.
+    """
+    return getattr(config, name, __defaults[name])
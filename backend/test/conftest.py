@@ -0,0 +1,22 @@
+#! python3
+
+# 3p Imports
+import pytest
+
+
+class FakeClock:
+    """
+    A clock for the tests to move by hand, in place of time.monotonic or
+    time.time.
+    """
+
+    def __init__(self, now=0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,52 @@
+#! python3
+
+# 3p Imports
+import asyncio
+
+# Internal Imports
+from src.broadcast import Broadcaster, diff_watches
+
+
+def test_publish_delivers_each_message_to_every_subscriber():
+    async def run():
+        broadcaster = Broadcaster()
+        first, second = broadcaster.subscribe(), broadcaster.subscribe()
+        broadcaster.publish({'tick': 1})
+        return await first.get(), await second.get(), len(broadcaster)
+
+    assert asyncio.run(run()) == ({'tick': 1}, {'tick': 1}, 2)
+
+
+def test_publish_drops_the_oldest_message_for_a_slow_subscriber():
+    async def run():
+        broadcaster = Broadcaster(max_queued=2)
+        queue = broadcaster.subscribe()
+        for tick in range(3):
+            broadcaster.publish(tick)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_unsubscribe_stops_delivery():
+    async def run():
+        broadcaster = Broadcaster()
+        queue = broadcaster.subscribe()
+        broadcaster.unsubscribe(queue)
+        broadcaster.publish('ignored')
+        return queue.qsize(), len(broadcaster)
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+def test_diff_watches_returns_only_changed_fields():
+    snapshot = {}
+    first = diff_watches(snapshot, [{'market_id': 1, 'price': 10.0, 'cap': 5, 'last_updated': 1}])
+    second = diff_watches(snapshot, [
+        {'market_id': 1, 'price': 11.0, 'cap': 5, 'last_updated': 2},
+        {'market_id': 2, 'price': 3.0, 'cap': 7, 'last_updated': 2},
+    ])
+    third = diff_watches(snapshot, [{'market_id': 1, 'price': 11.0, 'cap': 5, 'last_updated': 3}])
+    assert first == [{'market_id': 1, 'price': 10.0, 'cap': 5}]
+    assert second == [{'market_id': 1, 'price': 11.0}, {'market_id': 2, 'price': 3.0, 'cap': 7}]
+    assert third == []
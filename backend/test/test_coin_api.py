@@ -0,0 +1,34 @@
+#! python3
+
+# PSL Imports
+import asyncio
+
+# Internal Imports
+from src.fake_coin_api import FakeCoinApi
+import src.coin_api as coin_api
+import src.fake_coin_api as fake_coin_api
+
+
+def test_coin_listing_records_the_credits_it_spends(monkeypatch):
+    spent = []
+
+    async def record_credits(credits):
+        spent.append(credits)
+
+    monkeypatch.setattr(coin_api, 'key', 'test-key', raising=False)
+    monkeypatch.setattr(coin_api, 'credit_listeners', [record_credits])
+    fake = FakeCoinApi(coins=12000)
+
+    async def run():
+        runner, url = await fake_coin_api.start(fake, port=8802)
+        try:
+            await coin_api.start_session(base_url=url)
+            return await coin_api.get_coin_listing()
+        finally:
+            await coin_api.close_session()
+            await runner.cleanup()
+
+    listing = asyncio.run(run())
+    assert len(listing) == 12000
+    assert spent == [3]
+    assert fake.usage()['usage']['total']['credits_used'] == 3
@@ -0,0 +1,49 @@
+#! python3
+
+# Internal Imports
+from src.coin_index import CoinIndex
+
+
+__coins = [
+    {'market_id': 1, 'name': 'Bitcoin', 'symbol': 'BTC'},
+    {'market_id': 1831, 'name': 'Bitcoin Cash', 'symbol': 'BCH'},
+    {'market_id': 3602, 'name': 'Bitcoin SV', 'symbol': 'BSV'},
+    {'market_id': 1027, 'name': 'Ethereum', 'symbol': 'ETH'},
+    {'market_id': 512, 'name': 'Stellar', 'symbol': 'XLM'},
+    {'market_id': 9999, 'name': 'Fake Ether', 'symbol': 'ETH'},
+]
+
+
+def test_resolve_finds_coins_by_name_symbol_and_id_ignoring_case():
+    index = CoinIndex(__coins)
+    assert index.resolve('bitcoin')['market_id'] == 1
+    assert index.resolve('Bitcoin Cash')['market_id'] == 1831
+    assert index.resolve('xlm')['market_id'] == 512
+    assert index.resolve('1027')['name'] == 'Ethereum'
+    assert index.resolve('Dogecoin') is None
+
+
+def test_resolve_prefers_the_lowest_market_id_when_symbols_collide():
+    assert CoinIndex(__coins).resolve('ETH')['market_id'] == 1027
+
+
+def test_search_returns_prefix_matches_on_names_and_symbols():
+    index = CoinIndex(__coins)
+    assert [c['market_id'] for c in index.search('bit')] == [1, 1831, 3602]
+    assert [c['market_id'] for c in index.search('bit', limit=2)] == [1, 1831]
+    assert [c['market_id'] for c in index.search('bs')] == [3602]
+
+
+def test_search_falls_back_to_close_names():
+    assert [c['market_id'] for c in CoinIndex(__coins).search('etherium')] == [1027]
+
+
+def test_load_replaces_the_indexed_coins():
+    index = CoinIndex(__coins)
+    index.load(__coins[:1])
+    assert len(index) == 1
+    assert index.resolve('Ethereum') is None
+
+
+def test_search_only_falls_back_to_close_names_without_prefix_matches():
+    assert [c['market_id'] for c in CoinIndex(__coins).search('bitcoin s')] == [3602]
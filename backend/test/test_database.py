@@ -0,0 +1,243 @@
+#! python3
+
+# PSL Imports
+from datetime import datetime, timedelta
+import asyncio
+
+# 3p Imports
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+# Internal Imports
+import src.database as db
+import src.settings as settings
+
+
+@pytest.fixture
+def database():
+    connection = db.db.connect(db='coinroll_test',
+                               host='mongomock://localhost', alias='default')
+    yield
+    connection.drop_database('coinroll_test')
+    db.db.disconnect()
+
+
+def __trade(_type, quantity, price):
+    return {
+        'market_id': 1,
+        'quantity': quantity,
+        'quote': {'name': 'Bitcoin', 'price': price},
+        'type': _type
+    }
+
+
+def test_batched_trades_keep_their_order(database):
+    trades = [__trade('purchase', 2, 100.0), __trade('sell', 2, 150.0)]
+    asyncio.run(db.create_transactions(trades))
+    records = asyncio.run(db.get_all_transactions_by_id(1))
+    assert [r['type'] for r in records] == ['purchase', 'sell']
+    assert records[0]['transaction_time'] < records[1]['transaction_time']
+    db.rebuild_positions()
+    position = asyncio.run(db.get_position(1))
+    assert position['current_coins'] == 0
+    assert position['total_coin_profit'] == 100.0
+
+
+def test_watch_updates_include_the_rest_of_a_partly_read_refresh(database):
+    refreshed = datetime(2021, 6, 1, 12, 0)
+    db.Watch.objects.insert([
+        db.Watch(market_id=_id, name=f'Coin {_id}', price=1.0,
+                 last_updated=refreshed)
+        for _id in (1, 2)
+    ], load_bulk=False)
+    updates = asyncio.run(db.get_watch_updates(refreshed))
+    assert sorted(w['market_id'] for w in updates) == [1, 2]
+
+
+@pytest.mark.parametrize('cursor', ['not base64!', 'bm8tc2VwYXJhdG9y',
+                                    'MjAyMS0wNi0wMXxub3QtYW4taWQ='])
+def test_malformed_cursors_are_rejected(database, cursor):
+    with pytest.raises(db.InvalidCursorError):
+        asyncio.run(db.get_transactions_page(cursor=cursor, limit=10))
+
+
+def test_a_sell_beyond_the_holdings_is_refused_before_it_is_saved(database):
+    quote = {'name': 'Bitcoin', 'price': 100.0}
+    asyncio.run(db.create_transaction(1, 2, quote, 'purchase'))
+    assert asyncio.run(db.create_transaction(1, 2, quote, 'sell')) is not None
+    assert asyncio.run(db.create_transaction(1, 2, quote, 'sell')) is None
+    records = asyncio.run(db.get_all_transactions_by_id(1))
+    assert [r['type'] for r in records] == ['purchase', 'sell']
+    assert asyncio.run(db.get_position(1))['current_coins'] == 0
+
+
+def __quote(_id, price, change):
+    return {
+        'id': _id,
+        'supply': 1000,
+        'cap': 5000,
+        'price': price,
+        'volume': 200,
+        'percent_changes': {'hour': change, 'day': change, 'week': change}
+    }
+
+
+def test_watchlist_refresh_stores_null_quote_fields(database):
+    db.Watch.objects.insert([
+        db.Watch(market_id=_id, name=f'Coin {_id}', price=1.0)
+        for _id in (1, 2)
+    ], load_bulk=False)
+    quotes = [__quote(1, None, None), __quote(2, 2.5, 0.5)]
+    result = asyncio.run(db.update_watchlist(quotes))
+    assert result['written'] == 2
+    new_coin = db.Watch.objects(market_id=1).first()
+    assert new_coin.price is None and new_coin.hour_change is None
+    assert db.Watch.objects(market_id=2).first().price == 2.5
+
+
+def test_batched_trades_recheck_holdings_after_a_concurrent_sell(database):
+    quote = {'name': 'Bitcoin', 'price': 100.0}
+    asyncio.run(db.create_transaction(1, 10, quote, 'purchase'))
+    asyncio.run(db.create_transaction(2, 10, dict(quote, name='Ether'),
+                                      'purchase'))
+    # /trades checked the holdings before this sell was made.
+    asyncio.run(db.create_transaction(2, 5, quote, 'sell'))
+    trades = [__trade('sell', 4, 150.0),
+              dict(__trade('sell', 8, 150.0), market_id=2)]
+    with pytest.raises(db.InsufficientCoinsError) as refused:
+        asyncio.run(db.create_transactions(trades))
+    assert refused.value.trade == 1
+    assert len(asyncio.run(db.get_all_transactions())) == 3
+    assert asyncio.run(db.get_position(1))['current_coins'] == 10
+    assert asyncio.run(db.get_position(2))['current_coins'] == 5
+
+
+def test_reverting_a_position_keeps_updates_made_on_top_of_it(database):
+    quote = {'name': 'Bitcoin', 'price': 100.0}
+    asyncio.run(db.create_transaction(1, 10, quote, 'purchase'))
+    unsaved = {'market_id': 1, 'name': 'Bitcoin', 'type': 'sell',
+               'transaction_time': datetime.utcnow(), 'price_in_usd': 150.0,
+               'quantity': 4}
+    applied = db.__apply_to_position([unsaved])
+    asyncio.run(db.create_transaction(1, 2, quote, 'sell'))
+    db.__revert_position(applied)
+    assert asyncio.run(db.get_position(1))['current_coins'] == 8
+
+
+@pytest.mark.parametrize('engine', ['scalar', 'vectorized'])
+def test_rebuild_positions_with_either_engine(database, monkeypatch, engine):
+    if engine == 'vectorized':
+        pytest.importorskip('numpy')
+    get = settings.get
+    monkeypatch.setattr(settings, 'get', lambda name: engine
+                        if name == 'portfolio_engine' else get(name))
+    trades = [__trade('purchase', 3, 100.0), __trade('purchase', 2, 120.0),
+              __trade('sell', 4, 150.0)]
+    asyncio.run(db.create_transactions(trades))
+    assert db.rebuild_positions() == 1
+    position = asyncio.run(db.get_position(1))
+    assert position['current_coins'] == 1
+    assert list(position['lots']) == [(1, 120.0)]
+    assert position['total_coin_profit'] == 3 * 50.0 + 30.0
+    rollup = db.DailyRollup.objects(market_id=1).first()
+    assert rollup.closing_coins == 1 and rollup.total_coin_profit == 180.0
+
+
+def test_price_buckets_expire_by_the_retention_they_were_created_with(database):
+    collection = db.PriceBucket._get_collection()
+    collection.create_index('hour', expireAfterSeconds=86400)
+    old_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    collection.insert_one({'market_id': 1, 'hour': old_hour, 'count': 0})
+    db.ensure_indexes()
+    indexes = collection.index_information()
+    assert 'hour_1' not in indexes
+    assert indexes['expires_at_1']['expireAfterSeconds'] == 0
+    days = timedelta(days=settings.get('history_raw_days'))
+    assert db.PriceBucket.objects(hour=old_hour).first().expires_at == \
+        old_hour + days
+    asyncio.run(db.record_price_history([{'id': 2, 'price': 1.5}]))
+    bucket = db.PriceBucket.objects(market_id=2).first()
+    assert bucket.expires_at == bucket.hour + days
+
+
+def __metadata(_id):
+    return {'name': f'Coin {_id}', 'symbol': f'C{_id}', 'logo': '', 'website': ''}
+
+
+def test_watching_a_coin_another_request_added_first(database):
+    db.ensure_indexes()
+    ids = (1, 2, 3)
+    metadata = {_id: __metadata(_id) for _id in ids}
+    quotes = {_id: __quote(_id, float(_id), 0.0) for _id in ids}
+    asyncio.run(db.add_watched_coin(2, metadata[2], quotes[2]))
+    added = asyncio.run(db.add_watched_coins(metadata, quotes))
+    assert added == {'added': [1, 3], 'already_watched': [2]}
+    assert asyncio.run(db.add_watched_coin(1, metadata[1], quotes[1])) is None
+    assert db.Watch.objects.count() == 3
+
+
+def test_watched_quotes_skip_prices_older_than_the_max_age(database):
+    now = datetime.utcnow()
+    db.Watch.objects.insert([
+        db.Watch(market_id=1, name='Coin 1', price=1.0, last_updated=now),
+        db.Watch(market_id=2, name='Coin 2', price=2.0,
+                 last_updated=now - timedelta(minutes=5))
+    ], load_bulk=False)
+    quotes = asyncio.run(db.get_watched_quotes(['1', '2', '3'], 60))
+    assert [(q['id'], q['price']) for q in quotes] == [(1, 1.0)]
+
+
+def test_coin_list_updates_only_write_new_and_changed_coins(database,
+                                                            monkeypatch):
+    get = settings.get
+    monkeypatch.setattr(settings, 'get', lambda name: 2
+                        if name == 'coin_list_chunk_size' else get(name))
+    listing = [{'id': i, 'name': f'Coin {i}', 'symbol': f'C{i}'}
+               for i in range(1, 6)]
+    assert db.update_coin_list(listing) == \
+        {'inserted': 5, 'updated': 0, 'unchanged': 0}
+    listing[0] = {'id': 1, 'name': 'Renamed', 'symbol': 'C1'}
+    listing.append({'id': 6, 'name': 'Coin 6', 'symbol': 'C6'})
+    assert db.update_coin_list(listing) == \
+        {'inserted': 1, 'updated': 1, 'unchanged': 4}
+    assert db.Coin.objects.count() == 6
+    assert db.Coin.objects(market_id=1).first().name == 'Renamed'
+
+
+@pytest.fixture
+def query_plan(monkeypatch):
+    # mongomock can't explain queries, so every query gets this plan instead.
+    plan = {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}
+    monkeypatch.setattr(db.db.queryset.QuerySet, 'explain',
+                        lambda self: {'queryPlanner': {'winningPlan': plan}})
+    return plan
+
+
+def test_check_indexes_reports_indexes_until_they_are_ensured(database,
+                                                              query_plan):
+    problems = db.check_indexes()
+    assert len(problems) == len(db.__DOCUMENTS)
+    assert problems[0].startswith('coin is missing indexes:')
+    db.ensure_indexes()
+    assert db.check_indexes() == []
+
+
+def test_check_indexes_reports_collection_scans(database, query_plan):
+    db.ensure_indexes()
+    query_plan['inputStage'] = {'stage': 'COLLSCAN'}
+    assert db.check_indexes() == [
+        'Coin by name uses a collection scan.',
+        'Transaction by market_id uses a collection scan.',
+        'Watch by market_id uses a collection scan.',
+        'Position by market_id uses a collection scan.'
+    ]
+
+
+def test_check_indexes_command(database, query_plan, capsys):
+    assert db.run_maintenance(['check-indexes'])
+    assert 'coin is missing indexes:' in capsys.readouterr().out
+    db.ensure_indexes()
+    assert db.run_maintenance(['check-indexes'])
+    assert capsys.readouterr().out == 'All indexes are in place.\n'
+    assert not db.run_maintenance([])
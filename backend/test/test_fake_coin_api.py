@@ -0,0 +1,56 @@
+#! python3
+
+# Internal Imports
+from src.fake_coin_api import FakeCoinApi
+
+
+def test_prices_are_deterministic_for_a_seed():
+    first = FakeCoinApi(seed=7)
+    second = FakeCoinApi(seed=7)
+    other = FakeCoinApi(seed=8)
+    moment = 1625097600.5
+    assert first.quote(1, moment) == second.quote(1, moment)
+    assert first.price(1, moment) != other.price(1, moment)
+    assert first.price(1, moment) != first.price(1, moment + 3600)
+
+
+def test_percent_changes_match_earlier_prices():
+    api = FakeCoinApi()
+    moment = 1625097600
+    quote = api.quote(3, moment)['quote']['USD']
+    hour_ago = api.price(3, moment - 3600)
+    expected = (quote['price'] / hour_ago - 1) * 100
+    assert abs(quote['percent_change_1h'] - expected) < 1e-9
+    assert quote['market_cap'] > 0
+
+
+def test_rate_limit_refuses_until_the_next_minute(clock):
+    clock.now = 1625097630
+    api = FakeCoinApi(rate_limit=2, clock=clock)
+    assert api.admit('map', 1) is None
+    assert api.admit('map', 1) is None
+    status, code, _, retry_after = api.admit('map', 1)
+    assert (status, code, retry_after) == (429, 1008, 30)
+    clock.now += 30
+    assert api.admit('map', 1) is None
+    assert api.rate_limited == 1
+
+
+def test_credits_are_charged_only_for_successful_requests(clock):
+    api = FakeCoinApi(daily_credits=3, clock=clock)
+    assert api.admit('quotes/latest', 2) is None
+    assert api.admit('info', 2)[:2] == (429, 1009)
+    assert api.admit('info', 1) is None
+    usage = api.usage()['usage']
+    assert usage['current_day']['credits_used'] == 3
+    assert usage['total']['credits_by_endpoint'] == {
+        'quotes/latest': 2, 'info': 1
+    }
+
+
+def test_error_rate_injects_server_errors():
+    always = FakeCoinApi(error_rate=1.0)
+    never = FakeCoinApi(error_rate=0.0)
+    assert always.admit('map', 1)[0] == 500
+    assert never.admit('map', 1) is None
+    assert always.errors == 1
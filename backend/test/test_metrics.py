@@ -0,0 +1,109 @@
+#! python3
+
+# PSL Imports
+from types import SimpleNamespace
+import asyncio
+
+# Internal Imports
+from src.metrics import Registry, Summary, TimingMiddleware, registry
+
+
+def test_summary_keeps_a_bounded_sample():
+    summary = Summary(size=100)
+    for i in range(1, 10001):
+        summary.observe(i)
+    assert summary.count == 10000
+    assert summary.total == 50005000
+    assert len(summary.samples) == 100
+    assert 3000 < summary.quantile(0.5) < 7000
+    assert summary.quantile(0.99) > summary.quantile(0.5)
+
+
+def test_render_writes_prometheus_text():
+    metrics = Registry(reservoir_size=10)
+    metrics.increment('requests_total', route='/summary')
+    metrics.increment('requests_total', 2, route='/summary')
+    metrics.set('ratio', None)
+    for value in (1, 2, 3, 4):
+        metrics.observe('seconds', value, route='/a"b')
+    lines = metrics.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/summary"} 3.0' in lines
+    assert 'ratio NaN' in lines
+    assert '# TYPE seconds summary' in lines
+    assert 'seconds{route="/a\\"b",quantile="0.5"} 3.0' in lines
+    assert 'seconds_sum{route="/a\\"b"} 10.0' in lines
+    assert 'seconds_count{route="/a\\"b"} 4' in lines
+
+
+def test_span_times_functions_and_counts_errors():
+    metrics = Registry(reservoir_size=10)
+
+    @metrics.span('database')
+    def read():
+        return 1
+
+    @metrics.span('coin_api')
+    async def fetch():
+        raise ValueError()
+
+    assert read() == 1
+    try:
+        asyncio.run(fetch())
+    except ValueError:
+        pass
+    text = metrics.render()
+    assert 'coinroll_span_seconds_count{kind="database",function="read"} 1' \
+        in text
+    assert 'coinroll_span_errors_total{kind="coin_api",function="fetch"} 1.0' \
+        in text
+    assert 'coinroll_span_errors_total{kind="database"' not in text
+
+
+def test_timing_middleware_labels_requests_by_route_template():
+    async def endpoint():
+        pass
+
+    route = SimpleNamespace(path='/summary/{coin_name}', endpoint=endpoint)
+    routes = SimpleNamespace(routes=[route])
+
+    async def app(scope, receive, send):
+        scope['endpoint'] = endpoint
+        await send({'type': 'http.response.start', 'status': 200})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'method': 'GET', 'app': routes}
+    asyncio.run(TimingMiddleware(app)(scope, None, send))
+    text = registry.render()
+    assert 'coinroll_http_requests_total{status="200",method="GET",' \
+        'route="/summary/{coin_name}"}' in text
+
+
+def test_timing_middleware_times_event_streams_separately():
+    async def endpoint():
+        pass
+
+    route = SimpleNamespace(path='/stream', endpoint=endpoint)
+    routes = SimpleNamespace(routes=[route])
+
+    async def app(scope, receive, send):
+        scope['endpoint'] = endpoint
+        await send({
+            'type': 'http.response.start', 'status': 200,
+            'headers': [(b'content-type', b'text/event-stream; charset=utf-8')]
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'method': 'GET', 'app': routes}
+    asyncio.run(TimingMiddleware(app)(scope, None, send))
+    text = registry.render()
+    assert 'coinroll_http_stream_seconds_count{method="GET",' \
+        'route="/stream"} 1' in text
+    assert 'coinroll_http_request_seconds_count{method="GET",' \
+        'route="/stream"}' not in text
@@ -160,3 +160,106 @@ def test_has_sufficient_coins_returns_true_when_user_sells_all_coins():
     assert portfolio.has_sufficient_coins(__filter_test_records('Ethereum'), 20)
     assert portfolio.has_sufficient_coins(__filter_test_records('Stellar'), 90)
     assert portfolio.has_sufficient_coins(__filter_test_records('Audius'), 15)
+
+
+def test_get_coin_summary_consumes_partial_lots_in_fifo_order():
+    records = [
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,0,0,0), 10.0, 5),
+        __create_test_record(1, 'Bitcoin', 'sell', datetime(2021,6,6,1,0,0), 20.0, 3),
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,2,0,0), 30.0, 5),
+        __create_test_record(1, 'Bitcoin', 'sell', datetime(2021,6,6,3,0,0), 40.0, 4),
+    ]
+    summary = portfolio.get_coin_summary(records, {'price': 50.0})
+    assert summary['current_coins'] == 3
+    assert summary['usd_invested'] == 200.0
+    assert summary['current_usd_value'] == 150.0
+    assert summary['total_coin_profit'] == 3 * 10.0 + 2 * 30.0 + 2 * 10.0
+
+
+def test_get_position_keeps_one_lot_per_transaction_regardless_of_quantity():
+    records = [
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,0,0,0), 1.0, 1000000),
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,1,0,0), 2.0, 1000000),
+        __create_test_record(1, 'Bitcoin', 'sell', datetime(2021,6,6,2,0,0), 3.0, 1500000),
+    ]
+    position = portfolio.get_position(records)
+    assert list(position['lots']) == [(500000, 2.0)]
+    assert position['current_coins'] == 500000
+    assert position['total_coin_profit'] == 1000000 * 2.0 + 500000 * 1.0
+
+
+def test_summarize_positions_matches_get_summary_for_the_same_records():
+    records = __create_test_records()
+    positions = {q['id']: portfolio.get_position([r for r in records if r['market_id'] == q['id']]) for q in __quotes}
+    assert portfolio.summarize_positions(positions, __quotes) == __summary
+
+
+def test_summarize_rollups_matches_the_records_in_the_window():
+    rollups = {}
+    positions = {}
+    for record in __create_test_records():
+        position = positions.setdefault(record['market_id'], portfolio.new_position())
+        profit = portfolio.apply_transaction(position, record)
+        portfolio.add_to_rollup(rollups, record, profit, position['current_coins'])
+    june_6 = [r for r in rollups.values() if r['day'] == datetime(2021,6,6)]
+    summary = portfolio.summarize_rollups(june_6)
+    assert set(summary['coin_summaries']) == {'Bitcoin', 'Ethereum', 'Stellar'}
+    assert summary['coin_summaries']['Bitcoin'] == {
+        'units_bought': 10,
+        'units_sold': 6,
+        'usd_invested': 7 * 35667.03870840223 + 3 * 35627.14021471484,
+        'usd_received': 6 * 36108.27668926529,
+        'total_coin_profit': __summary['coin_summaries']['Bitcoin']['total_coin_profit'],
+        'closing_coins': 4
+    }
+    assert summary['total_profit'] == 2647.4278851783456 + 0.2733433993001988
+
+
+def test_get_summary_partitions_interleaved_records_by_market_id():
+    records = [
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,0,0,0), 10.0, 5),
+        __create_test_record(2, 'Bitcoin', 'purchase', datetime(2021,6,6,1,0,0), 99.0, 7),
+        __create_test_record(1, 'Bitcoin', 'sell', datetime(2021,6,6,2,0,0), 20.0, 2),
+        __create_test_record(3, 'Stellar', 'purchase', datetime(2021,6,6,3,0,0), 1.0, 9),
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,4,0,0), 30.0, 1),
+    ]
+    summary = portfolio.get_summary(records, [{'id': 1, 'name': 'Bitcoin', 'price': 40.0}])
+    assert summary['coin_summaries'] == {
+        'Bitcoin': {
+            'current_coins': 4,
+            'usd_invested': 80.0,
+            'current_usd_value': 160.0,
+            'total_coin_profit': 20.0
+        }
+    }
+
+
+def test_get_summary_keeps_coins_that_share_a_name_apart():
+    records = [
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,0,0,0), 10.0, 5),
+        __create_test_record(2, 'Bitcoin', 'purchase', datetime(2021,6,6,1,0,0), 1.0, 7),
+    ]
+    quotes = [{'id': 1, 'name': 'Bitcoin', 'price': 20.0}, {'id': 2, 'name': 'Bitcoin', 'price': 2.0}]
+    summary = portfolio.get_summary(records, quotes)
+    assert set(summary['coin_summaries']) == {'Bitcoin (1)', 'Bitcoin (2)'}
+    assert summary['total_usd_invested'] == 57.0
+    assert summary['total_current_usd_value'] == 114.0
+
+
+def test_summarize_rollups_keeps_coins_that_share_a_name_apart():
+    rollups = {}
+    for record in [
+        __create_test_record(1, 'Bitcoin', 'purchase', datetime(2021,6,6,0,0,0), 10.0, 5),
+        __create_test_record(2, 'Bitcoin', 'purchase', datetime(2021,6,6,1,0,0), 1.0, 7),
+    ]:
+        portfolio.add_to_rollup(rollups, record, 0, record['quantity'])
+    summary = portfolio.summarize_rollups(list(rollups.values()))
+    assert set(summary['coin_summaries']) == {'Bitcoin (1)', 'Bitcoin (2)'}
+    assert summary['total_usd_invested'] == 57.0
+
+
+def test_get_unpriced_ids_lists_positions_without_a_quote():
+    positions = {1: portfolio.new_position(), 1027: portfolio.new_position()}
+    quotes = [{'id': 1027, 'name': 'Ethereum', 'price': 2500.0}]
+    assert portfolio.get_unpriced_ids(positions, quotes) == [1]
+    assert portfolio.get_unpriced_ids(positions, quotes + [{'id': 1}]) == []
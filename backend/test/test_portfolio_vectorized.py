@@ -0,0 +1,91 @@
+#! python3
+
+# 3p Imports
+from datetime import datetime, timedelta
+from random import Random
+import pytest
+
+# Internal Imports
+import src.portfolio as portfolio
+import src.portfolio_vectorized as portfolio_vectorized
+
+
+pytest.importorskip('numpy')
+
+
+def __create_random_records(seed, count, coins, oversell=False):
+    rng = Random(seed)
+    held = {}
+    records = []
+    start = datetime(2021, 1, 1)
+    for i in range(count):
+        _id = rng.randint(1, coins)
+        quantity = rng.randint(1, 1000)
+        enough = oversell or held.get(_id, 0) >= quantity
+        selling = enough and rng.random() < 0.4
+        held[_id] = held.get(_id, 0) + (-quantity if selling else quantity)
+        records.append({
+            'market_id': _id,
+            'name': f'Coin {_id}',
+            'type': 'sell' if selling else 'purchase',
+            'transaction_time': start + timedelta(minutes=i),
+            'price_in_usd': rng.uniform(0.01, 50000),
+            'quantity': quantity
+        })
+    return records
+
+
+def __create_quotes(coins):
+    return [{'id': i, 'name': f'Coin {i}', 'price': i * 1.5} for i in range(1, coins + 1)]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_get_summary_is_identical_to_the_portfolio_module(seed):
+    records = __create_random_records(seed, 2000, 8)
+    quotes = __create_quotes(8)
+    assert portfolio_vectorized.get_summary(records, quotes) == portfolio.get_summary(records, quotes)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_get_coin_summary_is_identical_to_the_portfolio_module(seed):
+    records = __create_random_records(seed, 500, 1)
+    quote = __create_quotes(1)[0]
+    assert portfolio_vectorized.get_coin_summary(records, quote) == portfolio.get_coin_summary(records, quote)
+
+
+def test_has_sufficient_coins_matches_the_portfolio_module():
+    records = __create_random_records(0, 500, 1)
+    held = portfolio.get_position(records)['current_coins']
+    assert portfolio_vectorized.has_sufficient_coins(records, held)
+    assert not portfolio_vectorized.has_sufficient_coins(records, held + 1)
+
+
+def test_get_summary_includes_quotes_without_records():
+    records = __create_random_records(0, 500, 3)
+    quotes = __create_quotes(4)
+    summary = portfolio_vectorized.get_summary(records, quotes)
+    assert summary == portfolio.get_summary(records, quotes)
+    assert summary['coin_summaries']['Coin 4']['current_coins'] == 0
+
+
+@pytest.mark.parametrize('oversell', [False, True])
+@pytest.mark.parametrize('seed', range(5))
+def test_replay_is_identical_to_the_portfolio_module(seed, oversell):
+    records = __create_random_records(seed, 2000, 8, oversell)
+    assert portfolio_vectorized.replay(records) == portfolio.replay(records)
+
+
+def test_oversold_positions_match_the_portfolio_module():
+    start = datetime(2021, 1, 1)
+    records = [
+        {'market_id': 1, 'name': 'Coin 1', 'type': _type, 'quantity': quantity,
+         'price_in_usd': price, 'transaction_time': start + timedelta(days=i)}
+        for i, (_type, quantity, price) in enumerate([
+            ('sell', 2, 5.0), ('purchase', 3, 10.0), ('sell', 5, 20.0),
+            ('purchase', 4, 30.0), ('sell', 1, 40.0)
+        ])
+    ]
+    positions, outcomes = portfolio_vectorized.replay(records)
+    assert (positions, outcomes) == portfolio.replay(records)
+    assert positions[1]['current_coins'] == -1
+    assert list(positions[1]['lots']) == [(3, 30.0)]
@@ -0,0 +1,102 @@
+#! python3
+
+# PSL Imports
+from datetime import datetime, timedelta
+import asyncio
+
+# 3p Imports
+import pytest
+
+# Internal Imports
+import src.pricing as pricing
+
+
+def __quote(_id, price):
+    return {'id': _id, 'name': f'Coin {_id}', 'price': price}
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    requested = []
+    watched = {1: __quote(1, 10.0), 2: __quote(2, None)}
+    listed = {1: __quote(1, 11.0), 2: __quote(2, 22.0), 3: __quote(3, None)}
+
+    async def get_watched_quotes(ids, max_age):
+        return [watched[int(_id)] for _id in ids if int(_id) in watched]
+
+    async def get_coin_quotes(ids):
+        requested.extend(ids)
+        return [listed[int(_id)] for _id in ids if int(_id) in listed]
+
+    monkeypatch.setattr(pricing.db, 'get_watched_quotes', get_watched_quotes)
+    monkeypatch.setattr(pricing.coin_api, 'get_coin_quotes', get_coin_quotes)
+    return requested
+
+
+def test_quotes_without_a_price_are_unavailable(sources):
+    quotes = asyncio.run(pricing.get_quotes([1, 2, 3]))
+    assert [(q['id'], q['price']) for q in quotes] == [(1, 10.0), (2, 22.0)]
+    assert sources == ['2', '3']
+
+
+def test_fresh_watched_prices_are_used_before_the_api(sources):
+    quotes = asyncio.run(pricing.get_quotes([1, 4]))
+    assert [(q['id'], q['price']) for q in quotes] == [(1, 10.0)]
+    assert sources == ['4']
+
+
+def test_watched_prices_are_skipped_when_max_age_is_zero(sources, monkeypatch):
+    get = pricing.settings.get
+    monkeypatch.setattr(pricing.settings, 'get', lambda name: 0
+                        if name == 'watch_price_max_age' else get(name))
+    quotes = asyncio.run(pricing.get_quotes([1]))
+    assert [(q['id'], q['price']) for q in quotes] == [(1, 11.0)]
+    assert sources == ['1']
+
+
+def test_refresh_watchlist_only_fetches_coins_that_are_due(monkeypatch):
+    now = datetime.utcnow()
+    watches = [
+        {'market_id': 1, 'hour_change': 0.0, 'last_updated': now},
+        {'market_id': 2, 'hour_change': 0.0, 'last_updated': None},
+        {'market_id': 3, 'hour_change': 0.0,
+         'last_updated': now - timedelta(days=2)}
+    ]
+    requested, written = [], []
+
+    async def get_refresh_candidates():
+        return watches
+
+    async def get_credit_usage(now):
+        return {'day': 0, 'month': 0}
+
+    async def fetch_coin_quotes(ids):
+        requested.extend(ids)
+        return [__quote(int(_id), 1.0) for _id in ids], []
+
+    async def update_watchlist(quotes):
+        written.extend(q['id'] for q in quotes)
+        return {'written': len(quotes), 'unchanged': 0}
+
+    async def record_price_history(quotes):
+        pass
+
+    monkeypatch.setattr(pricing.db, 'get_refresh_candidates',
+                        get_refresh_candidates)
+    monkeypatch.setattr(pricing.db, 'get_credit_usage', get_credit_usage)
+    monkeypatch.setattr(pricing.coin_api, 'fetch_coin_quotes',
+                        fetch_coin_quotes)
+    monkeypatch.setattr(pricing.db, 'update_watchlist', update_watchlist)
+    monkeypatch.setattr(pricing.db, 'record_price_history',
+                        record_price_history)
+    result = asyncio.run(pricing.refresh_watchlist())
+    assert result['plan']['ids'] == [2, 3]
+    assert requested == ['2', '3']
+    assert written == [2, 3]
+    assert result['written'] == 2
+
+    watches[1]['last_updated'] = watches[2]['last_updated'] = now
+    requested.clear()
+    result = asyncio.run(pricing.refresh_watchlist())
+    assert result['plan']['ids'] == []
+    assert requested == []
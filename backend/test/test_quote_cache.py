@@ -0,0 +1,73 @@
+#! python3
+
+# 3p Imports
+import asyncio
+
+# Internal Imports
+from src.quote_cache import QuoteCache
+
+
+def __make_fetch(calls, delay=0):
+    async def fetch(ids):
+        calls.append(list(ids))
+        await asyncio.sleep(delay)
+        return [{'id': int(_id), 'price': float(_id)} for _id in ids]
+    return fetch
+
+
+def test_get_many_serves_fresh_quotes_from_the_cache(clock):
+    calls = []
+    cache = QuoteCache(ttl=10, max_size=10, clock=clock)
+    fetch = __make_fetch(calls)
+    first = asyncio.run(cache.get_many(['1', '2'], fetch))
+    second = asyncio.run(cache.get_many(['2', '1'], fetch))
+    assert calls == [['1', '2']]
+    assert [q['id'] for q in first] == [1, 2]
+    assert [q['id'] for q in second] == [2, 1]
+    assert cache.stats() == {
+        'hits': 2, 'misses': 2, 'coalesced': 0, 'stale': 0, 'size': 2
+    }
+
+
+def test_get_many_refetches_quotes_once_they_expire(clock):
+    calls = []
+    cache = QuoteCache(ttl=10, max_size=10, clock=clock)
+    fetch = __make_fetch(calls)
+    asyncio.run(cache.get_many(['1'], fetch))
+    clock.now = 10
+    asyncio.run(cache.get_many(['1'], fetch))
+    assert calls == [['1'], ['1']]
+
+
+def test_get_many_evicts_the_least_recently_used_quote(clock):
+    calls = []
+    cache = QuoteCache(ttl=10, max_size=2, clock=clock)
+    fetch = __make_fetch(calls)
+    asyncio.run(cache.get_many(['1', '2'], fetch))
+    asyncio.run(cache.get_many(['1'], fetch))
+    asyncio.run(cache.get_many(['3'], fetch))
+    asyncio.run(cache.get_many(['1', '2'], fetch))
+    assert calls == [['1', '2'], ['3'], ['2']]
+
+
+def test_get_many_coalesces_concurrent_requests_for_the_same_id(clock):
+    calls = []
+    cache = QuoteCache(ttl=10, max_size=10, clock=clock)
+    fetch = __make_fetch(calls, delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(cache.get_many(['1'], fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == [['1']]
+    assert all(r == [{'id': 1, 'price': 1.0}] for r in results)
+    assert cache.stats()['coalesced'] == 4
+
+
+def test_get_stale_serves_expired_quotes(clock):
+    calls = []
+    cache = QuoteCache(ttl=10, max_size=10, clock=clock)
+    asyncio.run(cache.get_many(['1'], __make_fetch(calls)))
+    clock.now = 100
+    assert cache.get_stale(['1', '2']) == [{'id': 1, 'price': 1.0}]
+    assert cache.stats()['stale'] == 1
@@ -0,0 +1,97 @@
+#! python3
+
+# PSL Imports
+from random import Random
+import asyncio
+
+# 3p Imports
+import pytest
+
+# Internal Imports
+from src.resilience import (
+    CircuitBreaker, CircuitOpenError, UpstreamError, backoff, hedge, retry
+)
+
+
+def __make_request(outcomes, calls):
+    async def request():
+        calls.append(len(calls))
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return request
+
+
+def __run_retry(request, clock, waits, attempts=4, deadline=60):
+    async def sleep(delay):
+        waits.append(delay)
+        clock.now += delay
+    return asyncio.run(retry(request, attempts, deadline, base=1, cap=8,
+                             sleep=sleep, clock=clock, rng=Random(0)))
+
+
+def test_backoff_grows_exponentially_up_to_the_cap():
+    rng = Random(0)
+    for attempt in range(10):
+        assert 0 <= backoff(attempt, 0.5, 8, rng) <= min(8, 0.5 * 2 ** attempt)
+
+
+def test_retry_waits_out_retry_after(clock):
+    calls, waits = [], []
+    request = __make_request([UpstreamError('slow down', 429, 5), 'ok'], calls)
+    assert __run_retry(request, clock, waits) == 'ok'
+    assert len(calls) == 2
+    assert waits[0] >= 5
+
+
+def test_retry_does_not_retry_client_errors(clock):
+    calls, waits = [], []
+    request = __make_request([UpstreamError('bad id', 400)], calls)
+    with pytest.raises(UpstreamError):
+        __run_retry(request, clock, waits)
+    assert len(calls) == 1
+
+
+def test_retry_gives_up_when_the_wait_passes_the_deadline(clock):
+    calls, waits = [], []
+    request = __make_request([UpstreamError('slow down', 429, 30)], calls)
+    with pytest.raises(UpstreamError):
+        __run_retry(request, clock, waits, deadline=10)
+    assert len(calls) == 1
+    assert waits == []
+
+
+def test_circuit_breaker_opens_and_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    failing = __make_request([UpstreamError('down', 503)], [])
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            asyncio.run(breaker.call(failing))
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call(failing))
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+
+
+def test_circuit_breaker_ignores_client_errors():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    request = __make_request([UpstreamError('bad id', 400)], [])
+    with pytest.raises(UpstreamError):
+        asyncio.run(breaker.call(request))
+    assert breaker.state == 'closed'
+
+
+def test_hedge_returns_the_faster_request():
+    delays = [1.0, 0.0]
+
+    async def request():
+        delay = delays.pop(0)
+        await asyncio.sleep(delay)
+        return delay
+
+    assert asyncio.run(hedge(request, 0.01)) == 0.0
@@ -0,0 +1,65 @@
+#! python3
+
+# 3p Imports
+from datetime import datetime, timedelta
+
+# Internal Imports
+import src.scheduler as scheduler
+
+
+__now = datetime(2021, 6, 30, 12, 0, 0)
+
+
+def __create_test_watch(m_id: int, updated_ago: float, hour_change: float = 0.0, viewed_ago: float = None):
+    return {
+        'market_id': m_id,
+        'hour_change': hour_change,
+        'last_updated': __now - timedelta(seconds=updated_ago),
+        'last_viewed': None if viewed_ago is None else __now - timedelta(seconds=viewed_ago)
+    }
+
+
+def test_credits_for_charges_one_credit_per_hundred_ids():
+    assert scheduler.credits_for(0) == 0
+    assert scheduler.credits_for(1) == 1
+    assert scheduler.credits_for(100) == 1
+    assert scheduler.credits_for(101) == 2
+    assert scheduler.credits_for(10000) == 100
+
+
+def test_get_budget_reports_the_refresh_share_of_each_budget():
+    budget = scheduler.get_budget({'day': 100, 'month': 1000}, __now)
+    assert budget['day'] == {'used': 100, 'remaining': 333 * 0.8 - 100, 'resets_in': 12 * 3600}
+    assert budget['month']['remaining'] == 10000 * 0.8 - 1000
+    assert budget['month']['resets_in'] == 12 * 3600
+
+
+def test_get_interval_spreads_the_remaining_credits_until_the_budget_resets():
+    budget = scheduler.get_budget({'day': 0, 'month': 0}, __now)
+    assert scheduler.get_interval(1, budget) == 12 * 3600 / 266
+    assert scheduler.get_interval(250, budget) == 12 * 3600 / (266 // 3)
+    assert scheduler.get_interval(0, budget) == 30.0
+
+
+def test_get_interval_waits_for_the_reset_once_the_budget_is_spent():
+    budget = scheduler.get_budget({'day': 300, 'month': 300}, __now)
+    assert scheduler.get_interval(1, budget) == 12 * 3600
+
+
+def test_plan_refresh_refreshes_hot_coins_more_often_than_cold_ones():
+    watches = [
+        __create_test_watch(1, 200),
+        __create_test_watch(2, 200, hour_change=-2.5),
+        __create_test_watch(3, 200, viewed_ago=60),
+        __create_test_watch(4, 1000),
+    ]
+    plan = scheduler.plan_refresh(watches, {'day': 0, 'month': 0}, __now)
+    assert plan['interval'] == 12 * 3600 / 266
+    assert plan['ids'] == [2, 3, 4]
+    assert plan['credits'] == 1
+
+
+def test_plan_refresh_skips_refreshes_the_budget_cannot_afford():
+    plan = scheduler.plan_refresh([__create_test_watch(1, 10 ** 6)], {'day': 333, 'month': 333}, __now)
+    assert plan['ids'] == []
+    assert plan['credits'] == 0